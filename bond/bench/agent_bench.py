@@ -0,0 +1,243 @@
+import typing as T
+import json
+import time
+import asyncio
+import pathlib
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+from bond.config import Config
+from bond.bench.stub_server import StubServer, SCRIPT_t
+from bond.lib.agent.main import AsyncAgent
+from bond.lib.llm.impl.openai_old import OpenAILLM
+from bond.lib.llm import ratelimit
+from bond.lib.llm.interface import TextMsg
+
+ANSWER = """\
+Here is what I found:
+
+- `file_0.txt` and `file_1.txt` contain generated log lines.
+- The workspace has the expected layout.
+
+```python
+def summary(lines):
+    return {"count": len(lines), "first": lines[0], "last": lines[-1]}
+```
+
+Let me know if you want me to change anything else.
+"""
+
+
+def make_workspace(root: pathlib.Path, files: int, lines: int) -> None:
+    for i in range(files):
+        with open(root / f"file_{i}.txt", "w") as f:
+            for j in range(lines):
+                f.write(f"{j:08d} INFO worker-{j % 7} processed request id={i * lines + j} status=ok\n")
+    (root / "scratch.txt").write_text("")
+
+
+def make_script(root: pathlib.Path, files: int) -> SCRIPT_t:
+    return [
+        {
+            "tool_calls": [
+                {"name": "view", "arguments": {"path": str(root / "file_0.txt"), "offset": 0}},
+                {"name": "view", "arguments": {"path": str(root / f"file_{1 % files}.txt"), "offset": 500}},
+                {"name": "proc", "arguments": {"args": ["ls", "-la", str(root)]}},
+            ]
+        },
+        {
+            "tool_calls": [
+                {"name": "proc", "arguments": {"args": ["grep", "-c", "status=ok", str(root / f"file_{2 % files}.txt")]}},
+                {
+                    "name": "edit",
+                    "arguments": {"path": str(root / "scratch.txt"), "begin_line": 0, "end_line": 0, "text": "note"},
+                },
+            ]
+        },
+        {"text": ANSWER},
+    ]
+
+
+def percentile(values: T.List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class Probe:
+    """Accumulates time spent in a wrapped callable, per turn."""
+
+    def __init__(self) -> None:
+        self.total = 0.0
+
+    def wrap(self, f: T.Callable) -> T.Callable:
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.total += time.perf_counter() - t
+
+        return wrapper
+
+    def awrap(self, f: T.Callable[..., T.Awaitable]) -> T.Callable[..., T.Awaitable]:
+        async def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                self.total += time.perf_counter() - t
+
+        return wrapper
+
+
+async def run_session(conf: Config, turns: int, results: T.List[T.Dict[str, float]]) -> T.Dict[str, int]:
+    # One LLM per session so network time isn't mixed up between sessions.
+    llm = OpenAILLM(conf)
+    agent = AsyncAgent(conf, llm, lambda msg: None)
+    thread = agent.new_thread()
+
+    # Message encoding in the chat plus building the request body.
+    serialize = Probe()
+    tools = Probe()
+    agent.chat._prepare = serialize.wrap(agent.chat._prepare)  # type: ignore
+    llm._payload = serialize.wrap(llm._payload)  # type: ignore
+    agent.executor.arun = tools.awrap(agent.executor.arun)  # type: ignore
+
+    for i in range(turns):
+        serialize.total = tools.total = 0.0
+        network = _network_time(llm)
+        t = time.perf_counter()
+        await agent.run(thread, [TextMsg("user", f"Turn {i}: look at the workspace and summarise it.")])
+        total = time.perf_counter() - t
+        network = _network_time(llm) - network
+        results.append(
+            {
+                "total": total,
+                "network": network,
+                "serialize": serialize.total,
+                "tools": tools.total,
+                "overhead": total - network - tools.total,
+            }
+        )
+    return agent.executor.cache.stats()
+
+
+def _network_time(llm: OpenAILLM) -> float:
+    stats = [llm.http.stats]
+    if llm._ahttp is not None:
+        stats.append(llm._ahttp.stats)
+    return sum(s.connect + s.ttfb + s.download for s in stats)
+
+
+async def bench(args: argparse.Namespace) -> T.Dict[str, T.Any]:
+    with tempfile.TemporaryDirectory(prefix="bond-bench-") as tmp:
+        root = pathlib.Path(tmp) / "workspace"
+        state = pathlib.Path(tmp) / "state"
+        root.mkdir()
+        make_workspace(root, args.files, args.lines)
+
+        server = StubServer(
+            make_script(root, args.files),
+            latency=args.latency,
+            chunk_latency=args.chunk_latency,
+        ).start()
+
+        conf = Config(
+            {
+                "provider": {"name": "stub", "api_key": "bench", "model": "stub", "endpoint": server.url},
+                "stream": args.stream,
+                # Nothing the agent keeps on disk may outlive the run.
+                "blobs": {"path": str(state / "blobs")},
+                "web_fetch": {"cache_path": str(state / "http_cache")},
+                "tool_cache": {"enabled": args.tool_cache},
+            }
+        )
+        if args.memory:
+            tracemalloc.start()
+
+        results: T.List[T.Dict[str, float]] = []
+        t = time.perf_counter()
+        caches = await asyncio.gather(*[run_session(conf, args.turns, results) for _ in range(args.sessions)])
+        wall = time.perf_counter() - t
+
+        report: T.Dict[str, T.Any] = {
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "stream": args.stream,
+            "latency": args.latency,
+            "wall": wall,
+            "requests": server.requests,
+            "request_bytes": server.request_bytes,
+            "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "ratelimit": ratelimit.limiter_stats().get(server.url, {}),
+            # Every session has its own executor, summed over all of them.
+            "tool_cache": {k: sum(c[k] for c in caches) for k in caches[0]},
+        }
+        if args.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["traced_current"] = current
+            report["traced_peak"] = peak
+
+        for key in ("total", "network", "serialize", "tools", "overhead"):
+            values = [r[key] for r in results]
+            report[key] = {
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+            }
+
+        server.stop()
+        return report
+
+
+def print_report(report: T.Dict[str, T.Any]) -> None:
+    print(
+        f"{report['sessions']} sessions x {report['turns']} turns, stream={report['stream']}, "
+        f"latency={report['latency'] * 1000:.0f}ms, wall={report['wall']:.2f}s"
+    )
+    print(f"{report['requests']} requests, {report['request_bytes'] / 1024:.0f} KiB sent, maxrss {report['maxrss_kb'] / 1024:.0f} MiB")
+    if "traced_peak" in report:
+        print(f"traced memory: current {report['traced_current'] / 1024:.0f} KiB, peak {report['traced_peak'] / 1024:.0f} KiB")
+    if report["ratelimit"]:
+        r = report["ratelimit"]
+        print(f"ratelimit: {r['waits']} waits ({r['wait_time']:.2f}s, max {r['max_wait'] * 1000:.0f}ms), {r['throttled']} throttled, {r['retries']} retries")
+    if report["tool_cache"]["hits"] or report["tool_cache"]["misses"]:
+        c = report["tool_cache"]
+        print(f"tool cache: {c['hits']} hits, {c['misses']} misses, {c['evictions']} evictions, {c['invalidations']} invalidations")
+    print(f"{'per turn':<12}{'mean':>10}{'p50':>10}{'p95':>10}")
+    for key in ("total", "network", "serialize", "tools", "overhead"):
+        s = report[key]
+        print(f"{key:<12}{s['mean'] * 1000:>9.2f}ms{s['p50'] * 1000:>8.2f}ms{s['p95'] * 1000:>8.2f}ms")
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Measures agent overhead against a local stub provider.")
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent sessions.")
+    parser.add_argument("--turns", type=int, default=20, help="User turns per session.")
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub latency before each response.")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Stub latency per streamed chunk.")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--tool-cache", action="store_true", help="Enable the tool result cache.")
+    parser.add_argument("--memory", action="store_true", help="Trace allocations (slower).")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(bench(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    run()
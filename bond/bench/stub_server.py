@@ -0,0 +1,236 @@
+import typing as T
+import json
+import time
+import socket
+import argparse
+import threading as thr
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A script is a list of responses, each either {"text": "..."} or
+# {"tool_calls": [{"name": "...", "arguments": {...}}, ...]}. The response to a
+# request is picked by how many assistant turns its messages already contain,
+# so every conversation walks through the script independently (wrapping
+# around at the end) and the server itself stays stateless.
+SCRIPT_t = T.List[T.Dict[str, T.Any]]
+
+DEFAULT_SCRIPT: SCRIPT_t = [
+    {"tool_calls": [{"name": "proc", "arguments": {"args": ["echo", "hello"]}}]},
+    {"text": "Done. The command printed `hello`."},
+]
+
+
+def _assistant_turns(messages: T.List[T.Dict[str, T.Any]]) -> int:
+    turns = 0
+    prev = None
+    for m in messages:
+        role = m.get("role")
+        if role == "assistant" and prev != "assistant":
+            turns += 1
+        prev = role
+    return turns
+
+
+class StubServer:
+    """OpenAI-compatible chat completions server with scripted responses.
+
+    `latency` delays every response before its headers, `chunk_latency`
+    delays each streamed chunk of `chunk_chars` characters. Every
+    `fail_every`-th request (0 disables) is answered with a 429 and a
+    `Retry-After` of `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        script: T.Optional[SCRIPT_t] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        chunk_latency: float = 0.0,
+        chunk_chars: int = 16,
+        fail_every: int = 0,
+        retry_after: float = 0.0,
+    ) -> None:
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+
+        self.requests = 0
+        self.request_bytes = 0
+        self._mutex = thr.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: T.Optional[thr.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "StubServer":
+        self._thread = thr.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def _handle(self, req: BaseHTTPRequestHandler) -> None:
+        body = req.rfile.read(int(req.headers.get("Content-Length", 0)))
+        with self._mutex:
+            self.requests += 1
+            self.request_bytes += len(body)
+            n = self.requests
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.fail_every and n % self.fail_every == 0:
+            out = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit"}}).encode()
+            req.send_response(429)
+            req.send_header("Content-Type", "application/json")
+            req.send_header("Content-Length", str(len(out)))
+            req.send_header("Retry-After", str(self.retry_after))
+            req.end_headers()
+            req.wfile.write(out)
+            return
+
+        payload = json.loads(body)
+        step = self.script[_assistant_turns(payload.get("messages", [])) % len(self.script)]
+        legacy = "functions" in payload
+
+        if payload.get("stream"):
+            self._stream(req, step, legacy)
+        else:
+            out = json.dumps(self._completion(step, legacy)).encode()
+            req.send_response(200)
+            req.send_header("Content-Type", "application/json")
+            req.send_header("Content-Length", str(len(out)))
+            req.end_headers()
+            req.wfile.write(out)
+
+    def _completion(self, step: T.Dict[str, T.Any], legacy: bool) -> T.Dict[str, T.Any]:
+        if "tool_calls" in step:
+            calls = step["tool_calls"]
+            if legacy:
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "function_call": {"name": calls[0]["name"], "arguments": json.dumps(calls[0]["arguments"])},
+                }
+                finish_reason = "function_call"
+            else:
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{i}",
+                            "type": "function",
+                            "function": {"name": c["name"], "arguments": json.dumps(c["arguments"])},
+                        }
+                        for i, c in enumerate(calls)
+                    ],
+                }
+                finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": step.get("text", "")}
+            finish_reason = "stop"
+        return {"object": "chat.completion", "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]}
+
+    def _stream(self, req: BaseHTTPRequestHandler, step: T.Dict[str, T.Any], legacy: bool) -> None:
+        req.send_response(200)
+        req.send_header("Content-Type", "text/event-stream")
+        req.send_header("Transfer-Encoding", "chunked")
+        req.end_headers()
+
+        def event(data: str):
+            chunk = f"data: {data}\n\n".encode()
+            req.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            req.wfile.flush()
+
+        def delta(d: T.Dict[str, T.Any]):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            event(json.dumps({"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": d}]}))
+
+        if "tool_calls" in step:
+            for i, c in enumerate(step["tool_calls"][:1] if legacy else step["tool_calls"]):
+                args = json.dumps(c["arguments"])
+                for j in range(0, max(len(args), 1), self.chunk_chars):
+                    part = args[j : j + self.chunk_chars]
+                    if legacy:
+                        delta({"function_call": {"name": c["name"] if j == 0 else "", "arguments": part}})
+                    else:
+                        fn = {"arguments": part}
+                        if j == 0:
+                            fn["name"] = c["name"]
+                        delta({"tool_calls": [{"index": i, "id": f"call_{i}", "function": fn}]})
+        else:
+            text = step.get("text", "")
+            for j in range(0, len(text), self.chunk_chars):
+                delta({"content": text[j : j + self.chunk_chars]})
+
+        event("[DONE]")
+        req.wfile.write(b"0\r\n\r\n")
+        req.wfile.flush()
+
+
+def run():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server with scripted responses.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--script", help="JSON file with a list of scripted responses.")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--chunk-latency", type=float, default=0.0)
+    parser.add_argument("--chunk-chars", type=int, default=16)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    server = StubServer(
+        script,
+        args.host,
+        args.port,
+        args.latency,
+        args.chunk_latency,
+        args.chunk_chars,
+        args.fail_every,
+        args.retry_after,
+    )
+    print(f"Serving on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,119 @@
+import typing as T
+import json
+
+from bond.config import Config
+from bond.lib.llm.interface import (
+    MSG_t,
+    TextMsg,
+    FunctionCallMsg,
+    FunctionResultMsg,
+)
+
+
+def _preview(data: T.Any, chars: int) -> str:
+    txt = data if isinstance(data, str) else json.dumps(data)
+    if len(txt) <= chars:
+        return txt
+    half = chars // 2
+    return f"{txt[:half]}\n[... {len(txt) - 2 * half} chars elided ...]\n{txt[-half:]}"
+
+
+def _size(data: T.Any) -> int:
+    return len(data if isinstance(data, str) else json.dumps(data))
+
+
+class ContextManager:
+    """Keeps the context sent for every thread under a token budget.
+
+    Config lives under the `[context]` table:
+      budget_tokens (128000, 0 disables), target_ratio (0.75),
+      keep_recent (20), preview_chars (1000), bytes_per_token (4).
+    Tokens are estimated from the size of the encoded messages. Once a thread
+    crosses the budget, function results and calls older than the last
+    `keep_recent` messages are elided, oldest first, until it fits in
+    `budget_tokens * target_ratio`: first down to a head/tail preview, then
+    down to a stub. Leading system prompts are never touched. The history in
+    Chat stays complete, only the view that is sent is compacted, and elided
+    messages are memoized so the compacted prefix stays byte-identical.
+    """
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("context", {}) or {}
+        self.budget = int(conf.get("budget_tokens", 128000))
+        self.target_ratio = float(conf.get("target_ratio", 0.75))
+        self.keep_recent = int(conf.get("keep_recent", 20))
+        self.preview_chars = int(conf.get("preview_chars", 1000))
+        self.bytes_per_token = float(conf.get("bytes_per_token", 4))
+
+        # thread -> index -> (original message, level, elided message)
+        self._elided: T.Dict[str, T.Dict[int, T.Tuple[MSG_t, int, MSG_t]]] = {}
+
+    def drop(self, thread: str) -> None:
+        self._elided.pop(thread, None)
+
+    def estimate(self, wire: T.List[bytes]) -> int:
+        return int(sum(len(x) for x in wire) / self.bytes_per_token)
+
+    def _elide(self, msg: MSG_t, level: int) -> T.Optional[MSG_t]:
+        if isinstance(msg, FunctionResultMsg):
+            if level == 1:
+                if _size(msg.data) <= self.preview_chars:
+                    return None
+                return FunctionResultMsg(
+                    msg.name, {"elided": True, "size": _size(msg.data), "preview": _preview(msg.data, self.preview_chars)}
+                )
+            return FunctionResultMsg(msg.name, {"elided": True, "size": _size(msg.data)})
+        if isinstance(msg, FunctionCallMsg) and level == 2:
+            params = {k: v if _size(v) <= 64 else _preview(v, 64) for k, v in msg.params.items()}
+            if params == msg.params:
+                return None
+            return FunctionCallMsg(msg.name, params)
+        return None
+
+    def view(
+        self,
+        thread: str,
+        msgs: T.List[MSG_t],
+        wire: T.Callable[[T.List[MSG_t]], T.List[bytes]],
+        encode: T.Callable[[MSG_t], bytes],
+    ) -> T.List[MSG_t]:
+        """Returns the messages of `thread` to send, eliding old ones if it's over budget."""
+        elided = self._elided.setdefault(thread, {})
+        view = list(msgs)
+        for i, (orig, _, new) in list(elided.items()):
+            if i < len(msgs) and msgs[i] is orig:
+                view[i] = new
+            else:
+                del elided[i]
+
+        if self.budget <= 0:
+            return view
+
+        sizes = [len(x) for x in wire(view)]
+        total = sum(sizes) / self.bytes_per_token
+        if total <= self.budget:
+            return view
+
+        first = 0
+        while first < len(msgs) and isinstance(msgs[first], TextMsg) and msgs[first].role == "system":
+            first += 1
+        last = max(first, len(msgs) - self.keep_recent)
+
+        target = self.budget * self.target_ratio
+        for level in (1, 2):
+            for i in range(first, last):
+                if i in elided and elided[i][1] >= level:
+                    continue
+                new = self._elide(msgs[i], level)
+                if new is None:
+                    continue
+
+                size = len(encode(new))
+                total -= (sizes[i] - size) / self.bytes_per_token
+                sizes[i] = size
+                elided[i] = (msgs[i], level, new)
+                view[i] = new
+                if total <= target:
+                    return view
+
+        return view
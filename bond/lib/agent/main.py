@@ -1,31 +1,54 @@
+import asyncio
+import enum
 import threading as thr
 import typing as T
 import uuid
-from queue import Queue
 
 from bond.config import Config
 from bond.lib.llm.interface import (
     LLM,
     MSG_t,
+    DELTA_t,
     TextMsg,
     FunctionType,
     FunctionCallMsg,
     FunctionResultMsg,
     ErorrMsg,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
+    FunctionOutputDeltaMsg,
 )
+from bond.lib.agent.context import ContextManager
+from bond.lib.agent.store import SessionStore
+from bond.lib.functions.executor import ToolExecutor
+from bond.lib.functions.registry import ToolRegistry
+from bond.lib.functions.blobs import get_store
+from bond.lib.functions.web import get_client
+from bond.lib.functions import shell, capture
+from bond.lib import trace
 from bond.lib.prompts.initial import INITIAL_PROMPT
 from bond.lib.prompts.functions import FUNCTIONS_PROMPT
-from bond.lib.functions.impl.proc import ProcFunction
+from bond.lib.functions.impl.proc import ProcFunction, ProcBatchFunction
 from bond.lib.functions.impl.view import ViewFunction
-from bond.lib.functions.impl.edit import EditFunction
+from bond.lib.functions.impl.search import SearchFunction
+from bond.lib.functions.impl.edit import EditFunction, EditHunksFunction
 from bond.lib.functions.impl.web_fetch import WebFetchFunction
 from bond.lib.functions.impl.web_search import WebSearchFunction
+from bond.lib.functions.impl.blob_read import BlobReadFunction
 
 
 class Chat:
-    def __init__(self, llm: LLM) -> None:
+    def __init__(
+        self, llm: LLM, context: T.Optional[ContextManager] = None, store: T.Optional[SessionStore] = None
+    ) -> None:
         self.llm = llm
+        self.context = context
+        self.store = store
         self._threads: T.Dict[str, T.List[MSG_t]] = {}
+        # Per thread cache of `llm.encode_msg` results, aligned with the last
+        # view of the thread they were encoded from.
+        self._wire_msgs: T.Dict[str, T.List[MSG_t]] = {}
+        self._wire: T.Dict[str, T.List[bytes]] = {}
 
     def threads(self):
         return list(self._threads.keys())
@@ -35,84 +58,381 @@ class Chat:
             name = uuid.uuid4().hex[:8]
 
         self._threads[name] = []
+        self._wire_msgs[name] = []
+        self._wire[name] = []
+        if self.store is not None:
+            self.store.create(name)
 
         return name
 
+    def load_thread(self, name: str) -> str:
+        """Loads a stored thread, see SessionStore."""
+        assert self.store is not None
+        self._threads[name] = self.store.load(name)
+        self._wire_msgs[name] = []
+        self._wire[name] = []
+        return name
+
+    def fork_thread(self, src: str, name: T.Optional[str] = None, length: T.Optional[int] = None) -> str:
+        """Starts a new thread with the first `length` messages of `src`."""
+        if name is None:
+            name = uuid.uuid4().hex[:8]
+
+        if src in self._threads:
+            msgs = self._threads[src][:length] if length is not None else list(self._threads[src])
+            if self.store is not None:
+                self.store.create(name, msgs, parent=src)
+        else:
+            assert self.store is not None
+            msgs = self.store.fork(src, name, length)
+
+        self._threads[name] = msgs
+        self._wire_msgs[name] = []
+        self._wire[name] = []
+        return name
+
+    def drop_thread(self, name: str):
+        del self._threads[name]
+        del self._wire_msgs[name]
+        del self._wire[name]
+        if self.context is not None:
+            self.context.drop(name)
+        shell.close_session(name)
+
     def add_msg(self, thread: str, msg: MSG_t):
         if isinstance(msg, ErorrMsg):
             return
         self._threads[thread].append(msg)
+        if self.store is not None:
+            self.store.append(thread, msg)
+
+    def replace_msg(self, thread: str, index: int, msg: MSG_t):
+        self._threads[thread][index] = msg
+        if self.store is not None:
+            self.store.replace(thread, index, msg)
+
+    def truncate(self, thread: str, length: int):
+        del self._threads[thread][length:]
+        if self.store is not None:
+            self.store.truncate(thread, length)
+
+    def invalidate(self, thread: str):
+        """Drops the wire cache, needed only after mutating a message in place."""
+        self._wire_msgs[thread] = []
+        self._wire[thread] = []
+
+    def _encode(self, thread: str, msgs: T.List[MSG_t]) -> T.List[bytes]:
+        cached = self._wire_msgs[thread]
+        wire = self._wire[thread]
+
+        del cached[len(msgs) :]
+        del wire[len(msgs) :]
+        for i, msg in enumerate(msgs):
+            if i == len(cached):
+                cached.append(msg)
+                wire.append(self.llm.encode_msg(msg))
+            elif cached[i] is not msg:
+                cached[i] = msg
+                wire[i] = self.llm.encode_msg(msg)
+
+        return wire
+
+    def view(self, thread: str) -> T.List[MSG_t]:
+        """Returns the messages of `thread` as they are sent, compacted if over the context budget."""
+        if self.context is None:
+            return self._threads[thread]
+        return self.context.view(
+            thread, self._threads[thread], lambda msgs: self._encode(thread, msgs), self.llm.encode_msg
+        )
+
+    def wire(self, thread: str) -> T.List[bytes]:
+        """Returns the encoded view of `thread`, encoding only messages not seen before.
+
+        Cached entries are matched to the view by identity, so replacing,
+        removing or truncating messages re-encodes only what changed.
+        """
+        return self._encode(thread, self.view(thread))
+
+    def _prepare(self, thread: str) -> T.Tuple[T.List[MSG_t], T.List[bytes]]:
+        with trace.span("chat.prepare"):
+            msgs = self.view(thread)
+            return msgs, list(self._encode(thread, msgs))
 
     def send(self, thread: str, functions: T.List[FunctionType]):
-        return self.llm.send(self._threads[thread], functions)
+        msgs, wire = self._prepare(thread)
+        return self.llm.send(msgs, functions, wire)
+
+    def stream(self, thread: str, functions: T.List[FunctionType]):
+        msgs, wire = self._prepare(thread)
+        return self.llm.stream(msgs, functions, wire)
+
+    async def asend(self, thread: str, functions: T.List[FunctionType]):
+        msgs, wire = self._prepare(thread)
+        return await self.llm.asend(msgs, functions, wire)
+
+    def astream(self, thread: str, functions: T.List[FunctionType]):
+        msgs, wire = self._prepare(thread)
+        return self.llm.astream(msgs, functions, wire)
 
     def messages(self, thread: str) -> T.List[MSG_t]:
         return self._threads[thread]
 
 
-class Agent:
-    def __init__(self, config: Config, llm: LLM, cb: T.Callable[[MSG_t], None]) -> None:
+class AgentState(enum.Enum):
+    READY = "READY"
+    THINKING = "THINKING"  # waiting for the LLM
+    TOOLS = "TOOLS"  # running function calls
+    CANCELLING = "CANCELLING"
+
+
+class AsyncAgent:
+    def __init__(
+        self,
+        config: Config,
+        llm: LLM,
+        cb: T.Callable[[T.Union[MSG_t, DELTA_t]], None],
+        store: T.Optional[SessionStore] = None,
+    ) -> None:
         self.conf = config
+        trace.configure(config)
+        shell.configure(config)
 
-        self.chat = Chat(llm)
+        self.chat = Chat(llm, ContextManager(config), store)
         self.cb = cb
+        self.executor = ToolExecutor(config)
+        self.blobs = get_store(config)
+        self.web = get_client(config)
+        functions = [ProcFunction, ProcBatchFunction, ViewFunction, SearchFunction, EditFunction, EditHunksFunction, WebFetchFunction, WebSearchFunction]
+        if self.blobs.threshold > 0:
+            functions.append(BlobReadFunction)
+        self.registry = ToolRegistry(functions)
 
-        self.mutex = thr.Lock()
-        self.busy = False
-        self.cancel = thr.Event()
-        self.message_queue: Queue[MSG_t] = Queue(maxsize=100)
+        self.state = AgentState.READY
+        self.thread: T.Optional[str] = None
+        self._task: T.Optional["asyncio.Future[T.List[MSG_t]]"] = None
+        # Entries are either a single message or a batch of messages that is sent in one request.
+        self.message_queue: "asyncio.Queue[T.Union[MSG_t, T.List[MSG_t]]]" = asyncio.Queue(maxsize=100)
 
-        self.thread = thr.Thread(target=self.loop, daemon=True)  # TODO: dont use daemon
-        self.thread.start()
+    @property
+    def busy(self) -> bool:
+        return self.state != AgentState.READY
 
     def send_txt(self, msg: str):
-        self.message_queue.put(TextMsg("user", msg))
+        self.message_queue.put_nowait(TextMsg("user", msg))
 
-    def loop(self):
-        self.chat.new_thread("main")
-        self.chat.add_msg("main", TextMsg("system", INITIAL_PROMPT))
-        self.chat.add_msg("main", TextMsg("system", FUNCTIONS_PROMPT))
+    def cancel(self):
+        """Aborts the running step and drops everything queued behind it."""
+        while not self.message_queue.empty():
+            self.message_queue.get_nowait()
+        if self._task is not None and not self._task.done():
+            self.state = AgentState.CANCELLING
+            self._task.cancel()
 
-        while True:
-            self.busy = False
-            if self.message_queue.qsize() == 0:
-                self.cancel.clear()
-            msg = self.message_queue.get()
-            self.busy = True
+    def new_thread(self, name: T.Optional[str] = None) -> str:
+        thread = self.chat.new_thread(name)
+        self.chat.add_msg(thread, TextMsg("system", INITIAL_PROMPT))
+        self.chat.add_msg(thread, TextMsg("system", FUNCTIONS_PROMPT))
+        return thread
 
-            self.cb(msg)
-            self.chat.add_msg("main", msg)
+    def _on_output(self, name: str, stream: str, data: str) -> None:
+        self.cb(FunctionOutputDeltaMsg(name, stream, data))
 
-            # print([x.__dict__ for x in self.chat._threads["main"]])
-            functions = {
-                x.FUNCTION_t.name: x for x in [ProcFunction, ViewFunction, EditFunction, WebFetchFunction, WebSearchFunction]
-            }
+    async def step(self, thread: str, msgs: T.List[MSG_t]) -> T.List[MSG_t]:
+        """Adds `msgs` to the thread, sends it and runs the requested functions.
 
-            if self.cancel.is_set():
-                continue
+        Returns the function results that have to be sent back, an empty list
+        once the model is done.
+        """
+        shell.current_thread.set(thread)
+        capture.on_output.set(self._on_output)
+        with trace.span("agent.step", thread=thread):
+            return await self._step(thread, msgs)
+
+    async def _step(self, thread: str, msgs: T.List[MSG_t]) -> T.List[MSG_t]:
+        for msg in msgs:
+            self.cb(msg)
+            self.chat.add_msg(thread, msg)
+
+        self.state = AgentState.THINKING
+        if self.conf.get("stream", True):
+            resp = self.chat.astream(thread, self.registry)
+        else:
+            resp = _aiter(await self.chat.asend(thread, self.registry))
 
-            resp = self.chat.send("main", [f.FUNCTION_t for f in functions.values()])
-            for msg in resp:
+        calls: T.List[FunctionCallMsg] = []
+        try:
+            async for msg in resp:
                 self.cb(msg)
-                self.chat.add_msg("main", msg)
+                if isinstance(msg, (TextDeltaMsg, FunctionCallDeltaMsg)):
+                    continue
+                self.chat.add_msg(thread, msg)
 
                 if isinstance(msg, FunctionCallMsg):
-                    try:
-                        res = functions[msg.name].CALLABLE(**msg.params)
-                    except Exception as e:
-                        msg_txt = f"Failed to execute the function: {e.__class__.__name__} - {str(e)}"
-                        msg_err = ErorrMsg(msg_txt, e)
-                        msg_sys = TextMsg("system", msg_txt)
+                    calls.append(msg)
+
+            if not calls:
+                return []
+
+            self.state = AgentState.TOOLS
+            with trace.span("agent.tools", calls=len(calls)):
+                results = await self.executor.arun(calls, self.registry.functions)
+        except asyncio.CancelledError:
+            # Every call in the thread needs a result or the next request is rejected.
+            for call in calls:
+                self.chat.add_msg(thread, FunctionResultMsg(call.name, {"success": False, "output": "", "error": "Cancelled by the user"}))
+            raise
 
-                        res = "error"
+        batch: T.List[MSG_t] = []
+        for result in results:
+            res = result.data
+            if result.error is not None:
+                e = result.error
+                msg_txt = f"Failed to execute the function: {e.__class__.__name__} - {str(e)}"
+                msg_err = ErorrMsg(msg_txt, e)
+                msg_sys = TextMsg("system", msg_txt)
 
-                        self.cb(msg_err)
-                        self.chat.add_msg("main", msg_err)
-                        self.cb(msg_sys)
-                        self.chat.add_msg("main", msg_sys)
+                res = "error"
 
-                    self.message_queue.put(FunctionResultMsg(msg.name, res))
+                self.cb(msg_err)
+                self.chat.add_msg(thread, msg_err)
+                self.cb(msg_sys)
+                self.chat.add_msg(thread, msg_sys)
 
-                    if self.conf.get("provider", {}).get("name") == "gemini":
-                        # gemini does not work properly without this
-                        self.message_queue.put(TextMsg("user", ""))
+            elif result.call.name != BlobReadFunction.FUNCTION_t.name:
+                res = self.blobs.offload(res)
+
+            batch.append(FunctionResultMsg(result.call.name, res))
+
+        if self.conf.get("provider", {}).get("name") == "gemini":
+            # gemini does not work properly without this
+            batch.append(TextMsg("user", ""))
+
+        return batch
+
+    async def run(self, thread: str, msgs: T.List[MSG_t]):
+        """Drives a single turn on `thread` to completion without the queue."""
+        while msgs:
+            msgs = await self.step(thread, msgs)
+
+    async def loop(self, thread: T.Optional[str] = None):
+        """Serves the message queue on `thread`, a new one by default."""
+        if thread is None:
+            thread = self.new_thread()
+        self.thread = thread
+
+        # Function results go first so they directly follow their calls, input
+        # typed in the meantime rides along in the same request.
+        batch: T.List[MSG_t] = []
+        while True:
+            if batch:
+                entries: T.List[T.Union[MSG_t, T.List[MSG_t]]] = [batch]
+            else:
+                self.state = AgentState.READY
+                entries = [await self.message_queue.get()]
+            self.state = AgentState.THINKING
+            while not self.message_queue.empty():
+                entries.append(self.message_queue.get_nowait())
+
+            # Run as a task so cancel() can abort it wherever it is waiting.
+            self._task = asyncio.ensure_future(self.step(thread, _coalesce(entries)))
+            await asyncio.wait([self._task])
+            task, self._task = self._task, None
+
+            batch = []
+            if task.cancelled():
+                self.cb(ErorrMsg("Cancelled"))
+            elif task.exception() is not None:
+                e = task.exception()
+                self.cb(ErorrMsg(f"{e.__class__.__name__} - {e}", e))
+            else:
+                batch = task.result()
+
+
+def _coalesce(entries: T.List[T.Union[MSG_t, T.List[MSG_t]]]) -> T.List[MSG_t]:
+    """Flattens queue entries into one batch so they cost a single request.
+
+    Empty user messages only exist to give gemini a user turn after function
+    results, they are dropped when a real user message follows anyway.
+    """
+    msgs: T.List[MSG_t] = []
+    for entry in entries:
+        msgs.extend(entry if isinstance(entry, list) else [entry])
+
+    out: T.List[MSG_t] = []
+    for i, msg in enumerate(msgs):
+        if isinstance(msg, TextMsg) and msg.role == "user" and msg.data == "":
+            if any(isinstance(m, TextMsg) and m.role == "user" for m in msgs[i + 1 :]):
+                continue
+        out.append(msg)
+    return out
+
+
+async def _aiter(msgs: T.Iterable[MSG_t]) -> T.AsyncIterator[MSG_t]:
+    for msg in msgs:
+        yield msg
+
+
+class Agent:
+    """Blocking wrapper that hosts an AsyncAgent on its own event loop thread."""
+
+    def __init__(
+        self,
+        config: Config,
+        llm: LLM,
+        cb: T.Callable[[T.Union[MSG_t, DELTA_t]], None],
+        store: T.Optional[SessionStore] = None,
+        session: T.Optional[str] = None,
+    ) -> None:
+        """`session` is a thread already in the chat's store to continue, a new one is started by default."""
+        self.conf = config
+        self.cb = cb
+
+        self._ready = thr.Event()
+        self._event_loop: T.Optional[asyncio.AbstractEventLoop] = None
+        self._agent: T.Optional[AsyncAgent] = None
+
+        self.thread = thr.Thread(target=self._run, args=(llm, store, session), daemon=True)  # TODO: dont use daemon
+        self.thread.start()
+        self._ready.wait()
+
+    def _run(self, llm: LLM, store: T.Optional[SessionStore], session: T.Optional[str]):
+        self._event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._event_loop)
+        self._agent = AsyncAgent(self.conf, llm, self.cb, store)
+        if session is None:
+            session = self._agent.new_thread()
+        elif session not in self._agent.chat.threads():
+            self._agent.chat.load_thread(session)
+        self._agent.thread = session
+        self._ready.set()
+        self._event_loop.run_until_complete(self._agent.loop(session))
+
+    @property
+    def agent(self) -> AsyncAgent:
+        assert self._agent is not None
+        return self._agent
+
+    @property
+    def chat(self) -> Chat:
+        return self.agent.chat
+
+    @property
+    def session(self) -> str:
+        assert self.agent.thread is not None
+        return self.agent.thread
+
+    @property
+    def state(self) -> AgentState:
+        return self.agent.state
+
+    @property
+    def busy(self) -> bool:
+        return self.agent.busy
+
+    def cancel(self):
+        assert self._event_loop is not None
+        self._event_loop.call_soon_threadsafe(self.agent.cancel)
+
+    def send_txt(self, msg: str):
+        assert self._event_loop is not None
+        self._event_loop.call_soon_threadsafe(self.agent.send_txt, msg)
@@ -0,0 +1,221 @@
+import typing as T
+import os
+import json
+import time
+import queue
+import atexit
+import pathlib
+import threading as thr
+
+from bond.config import Config
+from bond.lib.llm.interface import MSG_t, TextMsg, dump_msg, load_msg
+
+VALID_ID = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-")
+
+
+class SessionStore:
+    """Durable, append-only storage for chat threads.
+
+    Config lives under the `[sessions]` table:
+      path (".bond/sessions"), flush_interval (0.5).
+    Every thread is a JSONL log under `<path>/<id>.jsonl` holding its messages
+    and the occasional `{"op": "truncate"}` / `{"op": "replace"}` record, so
+    loading one never touches the others. `<path>/index.jsonl` gets one
+    metadata line per thread and flush, the last one wins, and is compacted
+    when it's opened with too many stale lines.
+
+    Writes are queued and done in batches by a background thread, so the
+    agent never waits on the disk. The metadata is shared with that thread
+    and only touched under `_mutex`.
+    """
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("sessions", {}) or {}
+        self.path = pathlib.Path(conf.get("path", ".bond/sessions")).expanduser()
+        self.flush_interval = float(conf.get("flush_interval", 0.5))
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self._index_file = self.path / "index.jsonl"
+        self._mutex = thr.Lock()
+        self._meta: T.Dict[str, T.Dict[str, T.Any]] = {}
+        self._load_index()
+
+        self._queue: "queue.Queue[T.Tuple[T.Any, ...]]" = queue.Queue()
+        self._closed = False
+        self._writer = thr.Thread(target=self._run, name="bond-sessions", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _load_index(self) -> None:
+        lines = 0
+        try:
+            with open(self._index_file) as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        meta = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._meta[meta["id"]] = meta
+        except FileNotFoundError:
+            return
+
+        if lines > 2 * len(self._meta) + 100:
+            tmp = self._index_file.with_name(f"index.jsonl.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                for meta in self._meta.values():
+                    f.write(json.dumps(meta) + "\n")
+            os.replace(tmp, self._index_file)
+
+    def _file(self, thread: str) -> pathlib.Path:
+        if not thread or not set(thread) <= VALID_ID:
+            raise ValueError(f"Invalid session id: {thread!r}")
+        return self.path / f"{thread}.jsonl"
+
+    def sessions(self) -> T.List[T.Dict[str, T.Any]]:
+        """Metadata of every stored thread, most recently updated first."""
+        with self._mutex:
+            metas = [dict(m) for m in self._meta.values()]
+        return sorted(metas, key=lambda m: m["updated"], reverse=True)
+
+    def exists(self, thread: str) -> bool:
+        with self._mutex:
+            return thread in self._meta
+
+    def load(self, thread: str) -> T.List[MSG_t]:
+        self.flush()
+        msgs: T.List[MSG_t] = []
+        with open(self._file(thread)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn write at the end of the log
+                    break
+                op = entry.pop("op", None)
+                if op is None:
+                    msgs.append(load_msg(entry))
+                elif op == "truncate":
+                    del msgs[entry["length"] :]
+                elif op == "replace":
+                    msgs[entry["index"]] = load_msg(entry["msg"])
+        return msgs
+
+    def create(self, thread: str, msgs: T.Sequence[MSG_t] = (), parent: T.Optional[str] = None) -> None:
+        self._file(thread)
+        now = time.time()
+        with self._mutex:
+            self._meta[thread] = {"id": thread, "created": now, "updated": now, "count": 0, "title": "", "parent": parent}
+        self._queue.put(("create", thread, list(msgs)))
+
+    def append(self, thread: str, msg: MSG_t) -> None:
+        self._queue.put(("append", thread, msg))
+
+    def replace(self, thread: str, index: int, msg: MSG_t) -> None:
+        self._queue.put(("replace", thread, index, msg))
+
+    def truncate(self, thread: str, length: int) -> None:
+        self._queue.put(("truncate", thread, length))
+
+    def fork(self, src: str, dst: str, length: T.Optional[int] = None) -> T.List[MSG_t]:
+        """Copies the first `length` messages of `src` (all by default) into a new thread `dst`."""
+        msgs = self.load(src)
+        if length is not None:
+            msgs = msgs[:length]
+        self.create(dst, msgs, parent=src)
+        return msgs
+
+    def flush(self) -> None:
+        """Blocks until everything queued so far is written."""
+        if self._closed:
+            return
+        done = thr.Event()
+        self._queue.put(("flush", done))
+        done.wait()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(("close",))
+        self._writer.join()
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while items[-1][0] not in ("flush", "close"):
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(items)
+            except Exception as e:
+                print(f"Failed to write sessions: {e.__class__.__name__} - {e}")
+
+            for item in items:
+                if item[0] == "flush":
+                    item[1].set()
+                elif item[0] == "close":
+                    return
+
+    def _write(self, items: T.List[T.Tuple[T.Any, ...]]) -> None:
+        lines: T.Dict[str, T.List[str]] = {}
+        created: T.Set[str] = set()
+        for item in items:
+            op, args = item[0], item[1:]
+            if op in ("flush", "close"):
+                continue
+            thread = args[0]
+            out = lines.setdefault(thread, [])
+            if op == "create":
+                created.add(thread)
+                out.clear()
+                for msg in args[1]:
+                    out.append(json.dumps(dump_msg(msg)))
+            elif op == "append":
+                out.append(json.dumps(dump_msg(args[1])))
+            elif op == "replace":
+                out.append(json.dumps({"op": "replace", "index": args[1], "msg": dump_msg(args[2])}))
+            elif op == "truncate":
+                out.append(json.dumps({"op": "truncate", "length": args[1]}))
+
+        if not lines:
+            return
+
+        for thread, out in lines.items():
+            with open(self._file(thread), "w" if thread in created else "a") as f:
+                if out:
+                    f.write("\n".join(out) + "\n")
+
+        now = time.time()
+        with self._mutex:
+            for item in items:
+                op, args = item[0], item[1:]
+                if op in ("flush", "close"):
+                    continue
+                meta = self._meta[args[0]]
+                if op == "create":
+                    meta["count"] = len(args[1])
+                    for msg in args[1]:
+                        self._title(meta, msg)
+                elif op == "append":
+                    meta["count"] += 1
+                    self._title(meta, args[1])
+                elif op == "truncate":
+                    meta["count"] = min(meta["count"], args[1])
+            index = []
+            for thread in lines:
+                self._meta[thread]["updated"] = now
+                index.append(json.dumps(self._meta[thread]))
+
+        with open(self._index_file, "a") as f:
+            f.write("\n".join(index) + "\n")
+
+    @staticmethod
+    def _title(meta: T.Dict[str, T.Any], msg: MSG_t) -> None:
+        if not meta["title"] and isinstance(msg, TextMsg) and msg.role == "user" and msg.data.strip():
+            meta["title"] = msg.data.strip().splitlines()[0][:80]
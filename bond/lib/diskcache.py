@@ -0,0 +1,71 @@
+import typing as T
+import os
+import pathlib
+import threading as thr
+
+
+class DiskLRU:
+    """Base of the on-disk caches, one file per entry under `path`.
+
+    Subclasses map their keys to files matching `pattern` and go through
+    `_read`/`_write`. Writes land in a temp file that is moved into place, so
+    readers never see half an entry. Reads bump the mtime, which is what
+    eviction orders by once the files grow past `max_bytes`.
+    """
+
+    def __init__(self, path: pathlib.Path, max_bytes: int, pattern: str = "*/*") -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.pattern = pattern
+        self._mutex = thr.Lock()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self) -> T.List[T.Tuple[float, int, pathlib.Path]]:
+        entries = []
+        for p in self.path.glob(self.pattern):
+            if p.name.endswith(".tmp"):
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _read(self, f: pathlib.Path) -> T.Optional[bytes]:
+        try:
+            data = f.read_bytes()
+            os.utime(f)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write(self, f: pathlib.Path, data: bytes) -> None:
+        f.parent.mkdir(exist_ok=True)
+        tmp = f.with_name(f"{f.name}.{os.getpid()}.{thr.get_ident()}.tmp")
+        tmp.write_bytes(data)
+
+        with self._mutex:
+            try:
+                self._size -= f.stat().st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, f)
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries())
+        self._size = sum(x[1] for x in entries)
+        target = self.max_bytes * 0.9
+        for _, size, p in entries:
+            if self._size <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= size
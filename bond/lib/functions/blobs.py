@@ -0,0 +1,117 @@
+import typing as T
+import os
+import json
+import hashlib
+import pathlib
+import threading as thr
+from collections import OrderedDict
+
+from bond.config import Config
+
+
+class BlobStore:
+    """Content-addressed store for tool output too large to keep in the chat.
+
+    Config lives under the `[blobs]` table:
+      threshold (8000 chars, 0 disables), preview_chars (1000),
+      path (".bond/blobs").
+    Blobs are UTF-8 text files under `<path>/<handle[:2]>/<handle>`, the
+    handle being a prefix of the content's sha256, so identical output is only
+    ever stored once. The chat carries the handle and a head/tail preview,
+    the blob_read function pages through the rest.
+    """
+
+    CACHED = 8
+    # Longer lines are split so a page never has to cut one off.
+    LINE_CHARS = 2000
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("blobs", {}) or {}
+        self.threshold = int(conf.get("threshold", 8000))
+        self.preview_chars = int(conf.get("preview_chars", 1000))
+        self.path = pathlib.Path(conf.get("path", ".bond/blobs")).expanduser()
+
+        self._mutex = thr.Lock()
+        # handle -> lines, for paging through recently read blobs
+        self._lines: "OrderedDict[str, T.List[str]]" = OrderedDict()
+
+        self.stored = 0
+        self.deduped = 0
+
+    def _file(self, handle: str) -> pathlib.Path:
+        if len(handle) != 16 or not all(c in "0123456789abcdef" for c in handle):
+            raise ValueError(f"Invalid blob handle: {handle!r}")
+        return self.path / handle[:2] / handle
+
+    def put(self, text: str) -> str:
+        data = text.encode()
+        handle = hashlib.sha256(data).hexdigest()[:16]
+        f = self._file(handle)
+        if f.exists():
+            self.deduped += 1
+            return handle
+
+        f.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f.with_name(f"{handle}.{os.getpid()}.{thr.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, f)
+        self.stored += 1
+        return handle
+
+    def lines(self, handle: str) -> T.List[str]:
+        with self._mutex:
+            if handle in self._lines:
+                self._lines.move_to_end(handle)
+                return self._lines[handle]
+
+        lines = []
+        for line in self._file(handle).read_text().splitlines():
+            lines.extend(line[i : i + self.LINE_CHARS] for i in range(0, max(len(line), 1), self.LINE_CHARS))
+        with self._mutex:
+            self._lines[handle] = lines
+            while len(self._lines) > self.CACHED:
+                self._lines.popitem(last=False)
+        return lines
+
+    def _preview(self, text: str) -> str:
+        handle = self.put(text)
+        half = self.preview_chars // 2
+        return (
+            f"[Output stored as blob {handle}: {len(text)} chars. "
+            f"Use blob_read to page through it.]\n"
+            f"{text[:half]}\n[...]\n{text[-half:]}"
+        )
+
+    def offload(self, data: T.Any) -> T.Any:
+        """Replaces large strings in a function result with a blob handle and preview."""
+        if self.threshold <= 0:
+            return data
+        if isinstance(data, str):
+            return self._preview(data) if len(data) > self.threshold else data
+        if isinstance(data, dict):
+            return {k: self.offload(v) if isinstance(v, str) else v for k, v in data.items()}
+        txt = json.dumps(data)
+        return self._preview(txt) if len(txt) > self.threshold else data
+
+
+_stores: T.Dict[str, BlobStore] = {}
+_current: T.Optional[BlobStore] = None
+_stores_mutex = thr.Lock()
+
+
+def get_store(config: T.Optional[Config] = None) -> BlobStore:
+    """Returns the process wide store for the configured path.
+
+    Without `config` this is the store last requested with one (blob_read
+    has no config of its own), or one with the defaults.
+    """
+    global _current
+    with _stores_mutex:
+        if config is None:
+            if _current is None:
+                _current = BlobStore(Config({}))
+            return _current
+        store = BlobStore(config)
+        key = str(store.path.resolve())
+        _current = _stores.setdefault(key, store)
+        return _current
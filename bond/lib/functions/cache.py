@@ -0,0 +1,85 @@
+import typing as T
+import os
+import json
+import time
+import threading as thr
+from collections import OrderedDict
+
+from bond.config import Config
+
+
+def path_scope(path: str) -> str:
+    return os.path.realpath(os.path.expanduser(path))
+
+
+class ToolCache:
+    """LRU memo of read-only function results.
+
+    Config lives under the `[tool_cache]` table:
+      enabled (false), max_entries (256), max_bytes (32 MiB).
+    Entries are keyed on the function name and its CACHE_KEY, sized by their
+    JSON encoding, and dropped once their CACHE_TTL runs out or a function
+    declares it WRITES to their scope.
+    """
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("tool_cache", {}) or {}
+        self.enabled = bool(conf.get("enabled", False))
+        self.max_entries = int(conf.get("max_entries", 256))
+        self.max_bytes = int(conf.get("max_bytes", 32 * 1024 * 1024))
+
+        self._mutex = thr.Lock()
+        # (name, key) -> (scope, expires, size, result)
+        self._entries: "OrderedDict[T.Tuple[str, T.Hashable], T.Tuple[str, T.Optional[float], int, T.Any]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, name: str, key: T.Hashable) -> T.Tuple[bool, T.Any]:
+        with self._mutex:
+            entry = self._entries.get((name, key))
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._drop((name, key))
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end((name, key))
+            self.hits += 1
+            return True, entry[3]
+
+    def put(self, name: str, scope: str, key: T.Hashable, result: T.Any, ttl: T.Optional[float]) -> None:
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._mutex:
+            if (name, key) in self._entries:
+                self._drop((name, key))
+            self._entries[(name, key)] = (scope, expires, size, result)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, scope: str) -> None:
+        with self._mutex:
+            for k in [k for k, e in self._entries.items() if e[0] == scope]:
+                self._drop(k)
+                self.invalidations += 1
+
+    def _drop(self, k: T.Tuple[str, T.Hashable]) -> None:
+        self._bytes -= self._entries.pop(k)[2]
+
+    def stats(self) -> T.Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
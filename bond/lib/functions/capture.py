@@ -0,0 +1,103 @@
+import typing as T
+import codecs
+import contextvars
+
+HEAD_BYTES = 32 * 1024
+TAIL_BYTES = 32 * 1024
+
+# Receives (function name, stream, text) as a running function produces output,
+# set by the agent to forward it to the UI.
+on_output: "contextvars.ContextVar[T.Optional[T.Callable[[str, str, str], None]]]" = contextvars.ContextVar(
+    "bond_on_output", default=None
+)
+
+
+class Capture:
+    """Keeps the first `head` and last `tail` bytes of a stream in fixed buffers.
+
+    Everything in between is only counted, so memory does not depend on how
+    much a process writes. Data is forwarded to `cb` as it comes in.
+    """
+
+    def __init__(
+        self,
+        cb: T.Optional[T.Callable[[str], None]] = None,
+        head: int = HEAD_BYTES,
+        tail: int = TAIL_BYTES,
+    ) -> None:
+        self.cb = cb
+        self.head_size = head
+        self.head = bytearray()
+        self.ring = bytearray(tail)
+        self.pos = 0
+        self.filled = 0
+        self.total = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - self.filled
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total += len(data)
+        if self.cb is not None:
+            self.cb(self._decoder.decode(data))
+
+        room = self.head_size - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        size = len(self.ring)
+        if not data or not size:
+            return
+
+        if len(data) >= size:
+            self.ring[:] = data[-size:]
+            self.pos = 0
+        else:
+            end = self.pos + len(data)
+            if end <= size:
+                self.ring[self.pos : end] = data
+            else:
+                k = size - self.pos
+                self.ring[self.pos :] = data[:k]
+                self.ring[: end - size] = data[k:]
+            self.pos = end % size
+        self.filled = min(size, self.filled + len(data))
+
+    def tail(self) -> bytes:
+        if self.filled < len(self.ring):
+            return bytes(self.ring[: self.filled])
+        return bytes(self.ring[self.pos :] + self.ring[: self.pos])
+
+    def text(self) -> str:
+        if not self.dropped:
+            # Decoded in one go, a character may straddle head and tail.
+            return (bytes(self.head) + self.tail()).decode(errors="replace")
+        head = self.head.decode(errors="replace")
+        tail = self.tail().decode(errors="replace")
+        return f"{head}\n... [{self.dropped} bytes dropped] ...\n{tail}"
+
+
+def forwarder(name: str, stream: str) -> T.Optional[T.Callable[[str], None]]:
+    """A Capture callback that hands output of function `name` to the current on_output."""
+    cb = on_output.get()
+    if cb is None:
+        return None
+    return lambda text: cb(name, stream, text) if text else None
+
+
+def result(code: int, out: Capture, err: Capture, note: str = "") -> dict:
+    """Function result of a finished process, both streams are kept whatever its exit code."""
+    error = err.text().strip()
+    if note:
+        error = f"{error}\n{note}".strip()
+    return {
+        "success": code == 0,
+        "output": out.text().strip(),
+        "error": error,
+        "code": code,
+        "dropped": out.dropped + err.dropped,
+    }
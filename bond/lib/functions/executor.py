@@ -0,0 +1,151 @@
+import typing as T
+import asyncio
+import threading as thr
+from concurrent.futures import ThreadPoolExecutor
+
+from bond.config import Config
+from bond.lib.llm.interface import FunctionCallMsg
+from bond.lib.functions.interface import Function
+from bond.lib.functions.cache import ToolCache, path_scope
+from bond.lib.trace import span
+
+
+class ToolResult:
+    def __init__(self, call: FunctionCallMsg, data: T.Any, error: T.Optional[BaseException] = None) -> None:
+        self.call = call
+        self.data = data
+        self.error = error
+
+
+class ToolExecutor:
+    """Runs a batch of function calls concurrently on a bounded thread pool.
+
+    Config lives under the `[tools]` table:
+      max_workers (8), timeout (120) and per function tables such as
+      `[tools.proc]` with `concurrency` and `timeout` overrides.
+    Timeouts are measured from the moment the batch is submitted. A call that
+    times out keeps its worker until it returns but its result is discarded.
+    Calls that write to the same path, whatever their function, run one at a
+    time.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.conf = config.get("tools", {}) or {}
+        self.timeout = float(self.conf.get("timeout", 120))
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(self.conf.get("max_workers", 8)), thread_name_prefix="bond-tool"
+        )
+
+        self._mutex = thr.Lock()
+        self._limits: T.Dict[str, T.Optional[thr.Semaphore]] = {}
+        self._alimits: T.Dict[str, T.Optional[asyncio.Semaphore]] = {}
+        self._path_locks: T.Dict[str, thr.Lock] = {}
+        self.cache = ToolCache(config)
+
+    def _timeout(self, name: str) -> float:
+        return float((self.conf.get(name, {}) or {}).get("timeout", self.timeout))
+
+    def _limit(self, name: str, f: T.Type[Function]) -> T.Optional[thr.Semaphore]:
+        with self._mutex:
+            if name not in self._limits:
+                limit = (self.conf.get(name, {}) or {}).get("concurrency", f.CONCURRENCY)
+                self._limits[name] = thr.Semaphore(int(limit)) if limit else None
+            return self._limits[name]
+
+    def _writes(self, f: T.Type[Function], call: FunctionCallMsg) -> T.List[str]:
+        if f.WRITES is None:
+            return []
+        try:
+            return [path_scope(path) for path in f.WRITES(**call.params)]
+        except Exception:
+            return []
+
+    def _locks(self, f: T.Type[Function], call: FunctionCallMsg) -> T.List[thr.Lock]:
+        """Locks of the paths the call writes to, always taken in the same order."""
+        paths = sorted(set(self._writes(f, call)))
+        with self._mutex:
+            return [self._path_locks.setdefault(path, thr.Lock()) for path in paths]
+
+    def _lookup(self, f: T.Type[Function], call: FunctionCallMsg) -> T.Tuple[T.Any, T.Optional[ToolResult]]:
+        """Returns the cache key of the call and the memoized result if there is one."""
+        if not self.cache.enabled or f.CACHE_KEY is None:
+            return None, None
+        try:
+            key = f.CACHE_KEY(**call.params)
+        except Exception:
+            return None, None
+        if key is None:
+            return None, None
+        hit, data = self.cache.get(call.name, key)
+        return key, ToolResult(call, data) if hit else None
+
+    def _store(self, f: T.Type[Function], call: FunctionCallMsg, key: T.Any, result: ToolResult) -> ToolResult:
+        if not self.cache.enabled:
+            return result
+        failed = isinstance(result.data, dict) and result.data.get("success") is False
+        if key is not None and result.error is None and not failed:
+            self.cache.put(call.name, key[0], key, result.data, f.CACHE_TTL)
+        for path in self._writes(f, call):
+            self.cache.invalidate(path)
+        return result
+
+    def _invoke(self, f: T.Type[Function], call: FunctionCallMsg) -> ToolResult:
+        limit = self._limit(call.name, f)
+        locks = self._locks(f, call)
+        try:
+            if limit is not None:
+                limit.acquire()
+            for lock in locks:
+                lock.acquire()
+            try:
+                with span(f"tool.{call.name}"):
+                    return ToolResult(call, f.CALLABLE(**call.params))
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+                if limit is not None:
+                    limit.release()
+        except Exception as e:
+            return ToolResult(call, None, e)
+
+    async def _acall(self, f: T.Type[Function], call: FunctionCallMsg) -> ToolResult:
+        key, hit = self._lookup(f, call)
+        if hit is not None:
+            return hit
+        if f.ACALLABLE is None:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self._pool, self._invoke, f, call)
+        else:
+            result = await self._ainvoke(f, call)
+        return self._store(f, call, key, result)
+
+    async def _ainvoke(self, f: T.Type[Function], call: FunctionCallMsg) -> ToolResult:
+        assert f.ACALLABLE is not None
+        if call.name not in self._alimits:
+            limit = (self.conf.get(call.name, {}) or {}).get("concurrency", f.CONCURRENCY)
+            self._alimits[call.name] = asyncio.Semaphore(int(limit)) if limit else None
+        limit = self._alimits[call.name]
+        try:
+            if limit is None:
+                with span(f"tool.{call.name}"):
+                    return ToolResult(call, await f.ACALLABLE(**call.params))
+            async with limit:
+                with span(f"tool.{call.name}"):
+                    return ToolResult(call, await f.ACALLABLE(**call.params))
+        except Exception as e:
+            return ToolResult(call, None, e)
+
+    async def _arun_one(self, call: FunctionCallMsg, functions: T.Mapping[str, T.Type[Function]]) -> ToolResult:
+        if call.name not in functions:
+            return ToolResult(call, None, KeyError(f"Unknown function: {call.name}"))
+        timeout = self._timeout(call.name)
+        try:
+            return await asyncio.wait_for(self._acall(functions[call.name], call), timeout)
+        except asyncio.TimeoutError:
+            return ToolResult(call, None, TimeoutError(f"Function timed out after {timeout} seconds"))
+
+    async def arun(self, calls: T.List[FunctionCallMsg], functions: T.Mapping[str, T.Type[Function]]) -> T.List[ToolResult]:
+        return list(await asyncio.gather(*[self._arun_one(call, functions) for call in calls]))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,45 @@
+from bond.lib.functions.interface import Function, FunctionType
+from bond.lib.functions.blobs import get_store
+
+LINES_COUNT = 200
+MAX_CHARS = 6000
+
+
+def blob_read(handle: str, offset: int) -> dict:
+    try:
+        lines = get_store().lines(handle)
+    except FileNotFoundError:
+        return {"success": False, "output": "", "error": f"Blob not found: {handle}"}
+    except ValueError as e:
+        return {"success": False, "output": "", "error": str(e)}
+
+    out = []
+    size = 0
+    i = max(0, offset)
+    while i < len(lines) and len(out) < LINES_COUNT:
+        line = f"{i}|{lines[i]}"
+        if out and size + len(line) > MAX_CHARS:
+            break
+        out.append(line)
+        size += len(line) + 1
+        i += 1
+
+    return {
+        "success": True,
+        "output": "\n".join(out),
+        "error": "",
+        "lines": len(lines),
+        "next_offset": i if i < len(lines) else None,
+    }
+
+
+class BlobReadFunction(Function):
+    FUNCTION_t = FunctionType(
+        "blob_read",
+        "Reads a page of a stored function output that was too large to show in full. Line numbers start at 0.",
+        [
+            FunctionType.ParamLiteral("handle", "string", "Blob handle from the output preview."),
+            FunctionType.ParamLiteral("offset", "integer", "Line to start reading from. If unsure set to 0."),
+        ],
+    )
+    CALLABLE = blob_read
@@ -1,53 +1,170 @@
+import typing as T
+import io
+import os
+import codecs
 import pathlib
-from bond.lib.functions.interface import Function, FunctionType
-
-
-def _edit_text(path: pathlib.Path, begin_line: int, end_line: int, text: str):
-    with open(path, "r") as f:
-        lines = f.readlines()
-
-    lines = [x.strip() for x in lines]
-    num_lines = len(lines)
-
-    if not (0 <= begin_line <= num_lines):
-        return {
-            "success": False,
-            "error": f"Invalid begin_line: {begin_line}. Must be between 0 and {num_lines} (inclusive).",
-        }
-    if not (0 <= end_line <= num_lines):
-        return {
-            "success": False,
-            "error": f"Invalid end_line: {end_line}. Must be between 0 and {num_lines} (inclusive).",
-        }
-    if begin_line > end_line:
-        return {
-            "success": False,
-            "error": f"begin_line ({begin_line}) cannot be greater than end_line ({end_line})",
-        }
+import threading as thr
 
-    new_text_lines = text.splitlines()
-
-    new_lines_list = lines[:begin_line]
-    new_lines_list.extend(new_text_lines)
-    new_lines_list.extend(lines[end_line:])
-
-    new_content = "\n".join(new_lines_list)
-
-    with open(path, "w") as f:
-        f.write(new_content)
+from bond.lib.functions.interface import Function, FunctionType
 
-    return {"success": True}
+CHUNK = 1 << 20
+SNIFF = 1 << 16
+
+HUNK_t = T.Tuple[int, int, str]
+
+
+class _Lines:
+    """Moves whole lines from `f` to an output, or drops them, a chunk at a time."""
+
+    def __init__(self, f: T.BinaryIO) -> None:
+        self.f = f
+        self.buf = b""
+        # The last byte read / written was not a newline.
+        self.partial = False
+        self.open = False
+
+    def move(self, n: int, out: T.Optional[T.BinaryIO]) -> int:
+        done = 0
+        while done < n:
+            if not self.buf:
+                self.buf = self.f.read(CHUNK)
+                if not self.buf:
+                    # An unterminated last line still counts.
+                    if self.partial:
+                        self.partial = False
+                        done += 1
+                    break
+            k = self.buf.count(b"\n")
+            if done + k < n:
+                data, self.buf = self.buf, b""
+                done += k
+            else:
+                pos = -1
+                for _ in range(n - done):
+                    pos = self.buf.find(b"\n", pos + 1)
+                data, self.buf = self.buf[: pos + 1], self.buf[pos + 1 :]
+                done = n
+            self.partial = not data.endswith(b"\n")
+            if out is not None:
+                out.write(data)
+                self.open = self.partial
+        return done
+
+
+def _sniff(head: bytes) -> T.Tuple[bytes, str, bytes]:
+    """BOM, encoding and line ending of a file starting with `head`."""
+    if head.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        raise ValueError("UTF-16/32 files are not supported")
+    bom = codecs.BOM_UTF8 if head.startswith(codecs.BOM_UTF8) else b""
+    try:
+        # Not final, the sample may end in the middle of a character.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+    nl = head.find(b"\n")
+    eol = b"\r\n" if nl > 0 and head[nl - 1] == ord("\r") else b"\n"
+    return bom, encoding, eol
+
+
+def _check(hunks: T.List[HUNK_t]) -> T.Optional[str]:
+    for begin_line, end_line, _ in hunks:
+        if begin_line < 0:
+            return f"Invalid begin_line: {begin_line}. Must be >= 0."
+        if end_line < 0:
+            return f"Invalid end_line: {end_line}. Must be >= 0."
+        if begin_line > end_line:
+            return f"begin_line ({begin_line}) cannot be greater than end_line ({end_line})"
+    for (b0, e0, _), (b1, e1, _) in zip(hunks, hunks[1:]):
+        if e0 > b1:
+            return f"Hunks [{b0}, {e0}) and [{b1}, {e1}) overlap"
+    return None
+
+
+def _edit_text(path: pathlib.Path, hunks: T.List[HUNK_t]):
+    """Applies `hunks`, given in line numbers of the original file, through a temp file.
+
+    Unchanged lines are copied as bytes a chunk at a time, so line endings and
+    encoding are kept and memory use does not grow with the file. The result
+    replaces the original atomically.
+    """
+    hunks = sorted(hunks, key=lambda h: (h[0], h[1]))
+    error = _check(hunks)
+    if error is not None:
+        return {"success": False, "output": "", "error": error}
+
+    target = pathlib.Path(os.path.realpath(path))
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{thr.get_ident()}.tmp")
+    src = open(target, "rb") if target.exists() else io.BytesIO()
+    try:
+        with src, open(tmp, "w+b") as out:
+            head = src.read(SNIFF)
+            bom, encoding, eol = _sniff(head)
+            src.seek(0, os.SEEK_END)
+            size = src.tell()
+            src.seek(max(0, size - 1))
+            missing_eol = size > 0 and src.read(1) != b"\n"
+            src.seek(len(bom))
+            out.write(bom)
+
+            lines = _Lines(src)
+            pos = delta = 0
+            for begin_line, end_line, text in hunks:
+                pos += lines.move(begin_line - pos, out)
+                pos += lines.move(end_line - pos, None)
+                if pos < end_line:
+                    num_lines = pos + lines.move(1 << 62, None)
+                    which, line = ("begin_line", begin_line) if pos < begin_line else ("end_line", end_line)
+                    return {
+                        "success": False,
+                        "output": "",
+                        "error": f"Invalid {which}: {line}. Must be between 0 and {num_lines} (inclusive).",
+                    }
+                new = text.splitlines()
+                if new and lines.open:
+                    out.write(eol)
+                    lines.open = False
+                for line in new:
+                    out.write(line.encode(encoding))
+                    out.write(eol)
+                delta += len(new) - (end_line - begin_line)
+            pos += lines.move(1 << 62, out)
+
+            # Text inserted at the end of a file without a final newline leaves it without one.
+            if missing_eol and hunks[-1][1] == pos and hunks[-1][2].splitlines():
+                out.truncate(out.tell() - len(eol))
+
+            out.flush()
+            os.fsync(out.fileno())
+        if target.exists():
+            os.chmod(tmp, target.stat().st_mode & 0o7777)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return {"success": True, "output": "", "error": "", "lines": pos + delta}
+
+
+def _run(path: str, hunks: T.List[HUNK_t]):
+    p = pathlib.Path(path)
+    if p.exists() and not p.is_file():
+        return {"success": False, "output": "", "error": "Path is not a file"}
+    try:
+        return _edit_text(p, hunks)
+    except Exception as e:
+        return {"success": False, "output": "", "error": f"{e.__class__.__name__} - {e}"}
 
 
 def edit(path: str, begin_line: int, end_line: int, text: str):
-    p = pathlib.Path(path)
-    if not p.exists():
-        open(p, "w").close()
-        # return {"success": False, "error": "Path not found"}
-    if not p.is_file():
-        return {"success": False, "error": "Path is not a file"}
+    return _run(path, [(begin_line, end_line, text)])
+
 
-    return _edit_text(p, begin_line, end_line, text)
+def edit_hunks(path: str, begin_lines: T.List[int], end_lines: T.List[int], texts: T.List[str]):
+    if not (len(begin_lines) == len(end_lines) == len(texts)):
+        return {"success": False, "output": "", "error": "begin_lines, end_lines and texts must have the same length"}
+    if not texts:
+        return {"success": False, "output": "", "error": "No hunks given"}
+    return _run(path, list(zip(begin_lines, end_lines, texts)))
 
 
 DOC = """\
@@ -61,7 +178,7 @@ DOC = """\
    - end_line is exclusive; 0 <= begin_line <= end_line <= num_lines
    - If begin_line == end_line, the edit is an insertion at that position
  - Path handling:
-   - If path does not exist, the implementation may create an empty file before editing
+   - If path does not exist, it is created
    - If path exists but is not a regular file, return error: "Path is not a file"
    - If parent directories do not exist or permissions prevent file creation, write will fail
 
@@ -72,18 +189,18 @@ DOC = """\
    - end_line > num_lines → error "Invalid end_line" (must be <= num_lines)
  - Text handling:
    - text = "" yields no insertion (no-op)
-   - If original file used CRLF, the result will use LF only (newline normalization)
+   - Lines outside the range are kept byte for byte, indentation included
+   - New lines take the line ending of the file (CRLF or LF)
  - Encoding and I/O:
-   - Reads use the platform default text encoding; non-UTF-8 bytes may raise UnicodeDecodeError
-   - Writing uses default encoding; encoding mismatches can occur for non-ASCII content
+   - New text is written as UTF-8, or Latin-1 for files that are not UTF-8; a UTF-8 BOM is kept
+   - UTF-16/32 files are not supported
  - File content integrity:
-   - The operation is not atomic; interruptions during write may leave the file partially updated
+   - The file is rewritten through a temporary file and replaced atomically; on error it is left untouched
    - If end_line equals num_lines, replacement occurs at end of file (append-like)
  - Edge behaviors:
    - Insertion near the start or end of a large file is handled the same as any other range
-   - Non-text files (where reading as text would fail) will raise an error when attempting to read/write
  - Return values:
-   - On success: {"success": True, "output": "", "error": ""} (output may be empty by design)
+   - On success: {"success": True, "output": "", "error": "", "lines": <num_lines after the edit>}
    - On error: {"success": False, "output": "", "error": "<descriptive message>"}
 
  Examples
@@ -116,3 +233,22 @@ class EditFunction(Function):
         ],
     )
     CALLABLE = edit
+    WRITES = lambda path, **_: [path]
+
+
+class EditHunksFunction(Function):
+    FUNCTION_t = FunctionType(
+        "edit_hunks",
+        "!!!UNSAFE!!!\n\n"
+        "Applies several edits to one file at once, hunk i replacing lines [begin_lines[i], end_lines[i]) "
+        "with texts[i], with the same semantics as `edit`. All line numbers refer to the file before any "
+        "hunk is applied, hunks must not overlap and either all of them are applied or none.",
+        [
+            FunctionType.ParamLiteral("path", "string", "Path to the file to be edited."),
+            FunctionType.ParamArray("begin_lines", "integer", "Starting line number (inclusive) of each hunk."),
+            FunctionType.ParamArray("end_lines", "integer", "Ending line number (exclusive) of each hunk."),
+            FunctionType.ParamArray("texts", "string", "New text of each hunk."),
+        ],
+    )
+    CALLABLE = edit_hunks
+    WRITES = lambda path, **_: [path]
@@ -1,46 +1,241 @@
 import typing as T
+import os
+import time
+import signal
+import asyncio
+import shlex
+import selectors
+import functools
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from bond.lib.functions.interface import FunctionType, Function
 from bond.config import GLOBAL_CONFIG
+from bond.lib.functions import shell
+from bond.lib.functions.capture import Capture, forwarder, result
 
 TIMEOUT = int(GLOBAL_CONFIG.get("proc_timeout", 30))
 
 
+# Time the pipes get to drain once a timed out process group is killed.
+GRACE = 1.0
+# Commands of a proc_batch call running at once.
+BATCH_CONCURRENCY = 8
+READ_SIZE = 1 << 16
+
+
+def _killpg(pid: int) -> None:
+    # Processes run in their own session, this also takes down their children.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _captures(
+    name: str = "proc", loop: T.Optional[asyncio.AbstractEventLoop] = None
+) -> T.Tuple[Capture, Capture]:
+    """stdout and stderr captures forwarding to the UI, through `loop` when filled from another thread."""
+    captures = []
+    for stream in ("stdout", "stderr"):
+        cb = forwarder(name, stream)
+        if cb is not None and loop is not None:
+            cb = functools.partial(loop.call_soon_threadsafe, cb)
+        captures.append(Capture(cb))
+    return captures[0], captures[1]
+
+
+def _timeout_note() -> str:
+    return f"Command timed out after {TIMEOUT} seconds"
+
+
+def _pump(process: subprocess.Popen, out: Capture, err: Capture) -> bool:
+    """Reads both pipes of `process` until they close, False if it had to be killed."""
+    assert process.stdout is not None and process.stderr is not None
+    captures = {process.stdout.fileno(): out, process.stderr.fileno(): err}
+    deadline = time.monotonic() + TIMEOUT
+    finished = True
+    with selectors.DefaultSelector() as sel:
+        for fd in captures:
+            sel.register(fd, selectors.EVENT_READ)
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if not finished:
+                    # Something that left the process group still holds the pipes.
+                    break
+                _killpg(process.pid)
+                finished = False
+                deadline = time.monotonic() + GRACE
+                continue
+            for key, _ in sel.select(remaining):
+                data = os.read(key.fd, READ_SIZE)
+                if data:
+                    captures[key.fd].write(data)
+                else:
+                    sel.unregister(key.fd)
+    return finished
+
+
 def proc(args: T.List[str]) -> dict:
+    thread = shell.current_thread.get()
+    if shell.enabled() and thread is not None:
+        out, err = _captures()
+        return shell.get_session(thread).run(args, TIMEOUT, out, err)
+    return _spawn(args, *_captures())
+
+
+def _spawn(args: T.List[str], out: Capture, err: Capture) -> dict:
     try:
-        process = subprocess.run(
+        process = subprocess.Popen(
             args,
-            capture_output=True,
-            text=True,
-            timeout=TIMEOUT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
             env={},
-            check=False,
+            start_new_session=True,
         )
+    except Exception as e:
+        return {"success": False, "output": "", "error": str(e), "code": -1}
+
+    with process:
+        finished = _pump(process, out, err)
+        code = process.wait()
+    if not finished:
+        return result(-1, out, err, _timeout_note())
+    return result(code, out, err)
+
 
-        return {
-            "success": process.returncode == 0,
-            "output": process.stdout.strip() if process.returncode == 0 else "",
-            "error": process.stderr.strip() if process.returncode != 0 else "",
-            "code": process.returncode,
-        }
-
-    except subprocess.TimeoutExpired:
-        return {
-            "success": False,
-            "output": "",
-            "error": f"Command timed out after {TIMEOUT} seconds",
-            "code": -1,
-        }
+async def _apump(stream: T.Optional[asyncio.StreamReader], capture: Capture) -> None:
+    assert stream is not None
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            return
+        capture.write(data)
+
+
+async def aproc(args: T.List[str]) -> dict:
+    thread = shell.current_thread.get()
+    if shell.enabled() and thread is not None:
+        loop = asyncio.get_event_loop()
+        out, err = _captures(loop=loop)
+        session = shell.get_session(thread)
+        try:
+            return await loop.run_in_executor(None, session.run, args, TIMEOUT, out, err)
+        except asyncio.CancelledError:
+            session.interrupt()
+            raise
+    return await _aspawn(args, *_captures())
+
+
+async def _aspawn(args: T.List[str], out: Capture, err: Capture) -> dict:
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.DEVNULL,
+            env={},
+            start_new_session=True,
+        )
     except Exception as e:
         return {"success": False, "output": "", "error": str(e), "code": -1}
 
+    pumps = [asyncio.ensure_future(_apump(process.stdout, out)), asyncio.ensure_future(_apump(process.stderr, err))]
+    try:
+        _, pending = await asyncio.wait(pumps, timeout=TIMEOUT)
+        if not pending:
+            return result(await process.wait(), out, err)
+        _killpg(process.pid)
+        await process.wait()
+        # Whatever is still buffered in the pipes.
+        await asyncio.wait(pumps, timeout=GRACE)
+        return result(-1, out, err, _timeout_note())
+    except asyncio.CancelledError:
+        _killpg(process.pid)
+        raise
+    finally:
+        for pump in pumps:
+            pump.cancel()
+
+
+def _parse(command: str) -> T.Union[T.List[str], dict]:
+    try:
+        args = shlex.split(command)
+    except ValueError as e:
+        return {"success": False, "output": "", "error": f"Invalid command: {e}", "code": -1}
+    if not args:
+        return {"success": False, "output": "", "error": "Empty command", "code": -1}
+    return args
+
+
+def _batch_result(commands: T.List[str], results: T.List[dict], start: float) -> dict:
+    return {
+        "success": all(r["success"] for r in results),
+        "output": "",
+        "error": "",
+        "results": [dict(command=c, **r) for c, r in zip(commands, results)],
+        "time": round(time.monotonic() - start, 3),
+    }
+
+
+def proc_batch(commands: T.List[str]) -> dict:
+    start = time.monotonic()
+
+    def run(command: str) -> dict:
+        t = time.monotonic()
+        args = _parse(command)
+        res = _spawn(args, *_captures("proc_batch")) if isinstance(args, list) else args
+        return dict(res, time=round(time.monotonic() - t, 3))
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="bond-proc") as pool:
+        results = list(pool.map(run, commands))
+    return _batch_result(commands, results, start)
+
+
+async def aproc_batch(commands: T.List[str]) -> dict:
+    start = time.monotonic()
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(command: str) -> dict:
+        async with limit:
+            t = time.monotonic()
+            args = _parse(command)
+            res = await _aspawn(args, *_captures("proc_batch")) if isinstance(args, list) else args
+            return dict(res, time=round(time.monotonic() - t, 3))
+
+    results = await asyncio.gather(*[run(c) for c in commands])
+    return _batch_result(commands, list(results), start)
+
 
 class ProcFunction(Function):
     FUNCTION_t = FunctionType(
         "proc",
-        "Starts a process and returns its output. Make sure you split the args properly.",
+        "Starts a process and returns its stdout and stderr, of long output only the beginning and the end "
+        "are kept. Make sure you split the args properly. If the result has a "
+        "`cwd` field commands run in a shell kept for the conversation: `cd` and `export` carry over to later calls.",
         [FunctionType.ParamArray("args", "string", "args that will be used to run a program where args[0] is the program")],
     )
     CALLABLE = proc
+    ACALLABLE = aproc
+
+
 
+class ProcBatchFunction(Function):
+    FUNCTION_t = FunctionType(
+        "proc_batch",
+        "Runs independent commands concurrently and returns the result of every command with its wall time "
+        f"in seconds. At most {BATCH_CONCURRENCY} run at once and each has its own timeout. Prefer it over several "
+        "proc calls when the commands do not depend on each other. Unlike proc, every command is a single "
+        "string split into args with POSIX shell quoting rules but not run by a shell: pipes, redirections, "
+        "globs, `&&` and variables are not interpreted. Each runs in a fresh process in the agent's working "
+        "directory, outside the conversation's shell session, so earlier `cd` and `export` do not apply.",
+        [
+            FunctionType.ParamArray(
+                "commands", "string", "Commands quoted like in a POSIX shell, e.g. \"git log -n 5 'src/a b.py'\"."
+            )
+        ],
+    )
+    CALLABLE = proc_batch
+    ACALLABLE = aproc_batch
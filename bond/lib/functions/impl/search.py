@@ -0,0 +1,301 @@
+import typing as T
+import os
+import re
+import mmap
+import fnmatch
+import itertools
+import multiprocessing
+import threading as thr
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+
+from bond.lib.functions.interface import Function, FunctionType
+
+MAX_MATCHES = 200
+MAX_LINE = 300
+MAX_CONTEXT = 10
+MAX_FILE_SIZE = 1 << 30
+IGNORE_FILES = (".gitignore", ".ignore")
+ALWAYS_IGNORED = {".git", ".hg", ".svn"}
+
+# Trees with fewer files than this are searched in-process, a pool would take
+# longer to start than the search itself.
+POOL_MIN_FILES = 2000
+BATCH_FILES = 256
+
+RULE_t = T.Tuple[str, T.Callable[[str], T.Any], bool, bool, bool]
+# (path, line, text, lines before, lines after)
+MATCH_t = T.Tuple[str, int, str, T.List[str], T.List[str]]
+
+_pool: T.Optional[ProcessPoolExecutor] = None
+_pool_mutex = thr.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_mutex:
+        if _pool is None:
+            # Forking would copy the agent's threads' locks in whatever state
+            # they are, workers start from a clean interpreter instead.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 4, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _read_ignore(d: str) -> T.List[RULE_t]:
+    """Parses the ignore files of directory `d` into (base, match, negate, dir_only, anchored) rules."""
+    rules: T.List[RULE_t] = []
+    for name in IGNORE_FILES:
+        try:
+            with open(os.path.join(d, name), errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            line = line[1:] if negate else line
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if line:
+                rules.append((d, re.compile(fnmatch.translate(line)).match, negate, dir_only, anchored))
+    return rules
+
+
+def _prefixes(rules: T.List[RULE_t], d: str) -> T.Dict[str, str]:
+    """Path of directory `d` relative to the base of every rule, computed once per directory."""
+    prefixes: T.Dict[str, str] = {}
+    for base, _, _, _, anchored in rules:
+        if anchored and base not in prefixes:
+            rel = os.path.relpath(d, base).replace(os.sep, "/")
+            prefixes[base] = "" if rel == "." else rel + "/"
+    return prefixes
+
+
+def _ignored(rules: T.List[RULE_t], prefixes: T.Dict[str, str], name: str, is_dir: bool) -> bool:
+    ignored = False
+    for base, match, negate, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if match(prefixes[base] + name if anchored else name):
+            ignored = not negate
+    return ignored
+
+
+def _parent_rules(root: str) -> T.List[RULE_t]:
+    """Rules of the directories above `root` up to the enclosing repository, if any."""
+    parents = []
+    d = os.path.dirname(os.path.realpath(root))
+    while True:
+        parents.append(d)
+        if os.path.exists(os.path.join(d, ".git")):
+            break
+        up = os.path.dirname(d)
+        if up == d:
+            return []
+        d = up
+    return [r for d in reversed(parents) for r in _read_ignore(d)]
+
+
+def _walk(root: str) -> T.Iterator[str]:
+    if os.path.exists(os.path.join(root, ".git")):
+        parent: T.List[RULE_t] = []
+    else:
+        parent = _parent_rules(root)
+    stack: T.List[T.Tuple[str, T.List[RULE_t]]] = [(root, parent)]
+    while stack:
+        d, rules = stack.pop()
+        rules = rules + _read_ignore(d)
+        prefixes = _prefixes(rules, d)
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.name in ALWAYS_IGNORED:
+                    continue
+                try:
+                    is_dir = e.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and e.is_file(follow_symlinks=False)
+                except OSError:
+                    continue
+                if (is_dir or is_file) and _ignored(rules, prefixes, e.name, is_dir):
+                    continue
+                if is_dir:
+                    stack.append((e.path, rules))
+                elif is_file:
+                    yield e.path
+
+
+def _decode(line: bytes) -> str:
+    return line[:MAX_LINE].decode(errors="replace")
+
+
+def _context(mm: mmap.mmap, start: int, end: int, size: int, n: int) -> T.Tuple[T.List[str], T.List[str]]:
+    """Up to `n` lines before and after the line spanning `start` to `end` (its newline, or -1)."""
+    before: T.List[str] = []
+    while len(before) < n and start > 0:
+        prev = mm.rfind(b"\n", 0, start - 1) + 1
+        before.append(_decode(mm[prev : start - 1]))
+        start = prev
+    before.reverse()
+
+    after: T.List[str] = []
+    while len(after) < n and end != -1 and end + 1 < size:
+        nxt = mm.find(b"\n", end + 1)
+        after.append(_decode(mm[end + 1 : nxt if nxt != -1 else size]))
+        end = nxt
+    return before, after
+
+
+def _search_files(
+    paths: T.List[str], pattern: bytes, literal: bool, context: int, limit: int
+) -> T.Tuple[T.List[MATCH_t], int]:
+    """Searches `paths`, returns up to `limit` matches and the number of files searched."""
+    rx = re.compile(re.escape(pattern) if literal else pattern, re.MULTILINE)
+    matches: T.List[MATCH_t] = []
+    searched = 0
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0 or size > MAX_FILE_SIZE:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if b"\0" in mm[:1024]:
+                        continue
+                    searched += 1
+                    line, pos, last_line = 0, 0, -1
+                    for m in rx.finditer(mm):
+                        line += mm[pos : m.start()].count(b"\n")
+                        pos = m.start()
+                        if line == last_line:
+                            continue
+                        last_line = line
+                        start = mm.rfind(b"\n", 0, m.start()) + 1
+                        end = mm.find(b"\n", m.start())
+                        text = _decode(mm[start : end if end != -1 else size])
+                        before, after = _context(mm, start, end, size, context) if context else ([], [])
+                        matches.append((path, line, text, before, after))
+                        if len(matches) >= limit:
+                            return matches, searched
+        except (OSError, ValueError):
+            continue
+    return matches, searched
+
+
+def _format(matches: T.List[MATCH_t], context: int) -> str:
+    """grep style output, `path:line: text` for matches and `path-line- text` for context."""
+    out: T.List[str] = []
+    for path, group in itertools.groupby(matches, key=lambda m: m[0]):
+        lines: T.Dict[int, T.Tuple[str, bool]] = {}
+        for _, line, text, before, after in group:
+            for i, t in enumerate(before):
+                lines.setdefault(line - len(before) + i, (t, False))
+            lines[line] = (text, True)
+            for i, t in enumerate(after):
+                lines.setdefault(line + 1 + i, (t, False))
+
+        prev = None
+        for n in sorted(lines):
+            if context and out and (prev is None or n != prev + 1):
+                out.append("--")
+            text, is_match = lines[n]
+            out.append(f"{path}:{n}: {text}" if is_match else f"{path}-{n}- {text}")
+            prev = n
+    return "\n".join(out)
+
+
+def search(pattern: str, path: str, regex: bool, context: int = 0) -> dict:
+    root = os.path.expanduser(path)
+    if not os.path.exists(root):
+        return {"success": False, "output": "", "error": "Path not found"}
+    try:
+        re.compile(pattern.encode() if regex else re.escape(pattern.encode()))
+    except re.error as e:
+        return {"success": False, "output": "", "error": f"Invalid pattern: {e}"}
+
+    context = max(0, min(int(context or 0), MAX_CONTEXT))
+    args = (pattern.encode(), not regex, context)
+    files = iter([root]) if os.path.isfile(root) else _walk(root)
+
+    matches: T.List[MATCH_t] = []
+    searched = 0
+    head: T.List[str] = []
+    for f in files:
+        head.append(f)
+        if len(head) >= POOL_MIN_FILES:
+            break
+
+    if len(head) < POOL_MIN_FILES:
+        matches, searched = _search_files(head, *args, MAX_MATCHES)
+    else:
+        # Batches are submitted while the walk goes on, results are collected
+        # as they come in until the match cap is reached.
+        pool = _get_pool()
+        pending: T.Set[Future] = set()
+
+        def collect(futures: T.Iterable[Future]) -> None:
+            nonlocal searched
+            for fut in futures:
+                m, n = fut.result()
+                matches.extend(m)
+                searched += n
+
+        for i in range(0, len(head), BATCH_FILES):
+            pending.add(pool.submit(_search_files, head[i : i + BATCH_FILES], *args, MAX_MATCHES))
+
+        batch: T.List[str] = []
+        for f in files:
+            batch.append(f)
+            if len(batch) >= BATCH_FILES:
+                pending.add(pool.submit(_search_files, batch, *args, MAX_MATCHES))
+                batch = []
+                done = {x for x in pending if x.done()}
+                pending -= done
+                collect(done)
+                if len(matches) >= MAX_MATCHES:
+                    break
+        else:
+            if batch:
+                pending.add(pool.submit(_search_files, batch, *args, MAX_MATCHES))
+
+        while pending and len(matches) < MAX_MATCHES:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        for fut in pending:
+            fut.cancel()
+
+    truncated = len(matches) >= MAX_MATCHES
+    matches = sorted(matches[:MAX_MATCHES])
+    return {
+        "success": True,
+        "output": _format(matches, context),
+        "error": "",
+        "matches": len(matches),
+        "files": searched,
+        "truncated": truncated,
+    }
+
+
+class SearchFunction(Function):
+    FUNCTION_t = FunctionType(
+        "search",
+        "Searches the files under a directory (or a single file) and returns matching lines as "
+        "path:line: text, line numbers start at 0. Context lines are shown as path-line- text, with -- "
+        "between groups. Ignore files are respected and binary files are "
+        f"skipped. At most {MAX_MATCHES} matches are returned.",
+        [
+            FunctionType.ParamLiteral("pattern", "string", "Text or regular expression to search for."),
+            FunctionType.ParamLiteral("path", "string", "Directory or file to search."),
+            FunctionType.ParamLiteral("regex", "boolean", "Treat the pattern as a regular expression."),
+            FunctionType.ParamLiteral(
+                "context", "integer", f"Lines of context to show around each match, 0 to {MAX_CONTEXT}."
+            ),
+        ],
+    )
+    CALLABLE = search
@@ -1,33 +1,118 @@
+import typing as T
+import os
+import mmap
+import codecs
 import pathlib
+import threading as thr
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
 from bond.lib.functions.interface import Function, FunctionType
+from bond.lib.functions.cache import path_scope
 
 LINES_COUNT = 1024
+HEX_BYTES = 1024
+
+BLOCK = 1 << 16
+CHUNK = 1 << 24
+INDEXES = 32
+
+
+class _LineIndex:
+    """Number of newlines before every BLOCK bytes of a file.
+
+    Built from large chunks at C speed, it turns seeking to any line into a
+    bisect plus a scan of at most one block.
+    """
+
+    def __init__(self, mm: mmap.mmap, size: int) -> None:
+        self.counts = array("Q")
+        total = 0
+        for start in range(0, size, CHUNK):
+            chunk = mm[start : start + CHUNK]
+            for b in range(0, len(chunk), BLOCK):
+                self.counts.append(total)
+                total += chunk.count(b"\n", b, b + BLOCK)
+        self.lines = total + (mm[size - 1 : size] != b"\n")
+
+    def seek(self, mm: mmap.mmap, line: int) -> int:
+        if line <= 0:
+            return 0
+        line = min(line, self.lines)
+        b = bisect_left(self.counts, line) - 1
+        pos = b * BLOCK
+        for _ in range(line - self.counts[b]):
+            pos = mm.find(b"\n", pos) + 1
+            if pos == 0:
+                return len(mm)
+        return pos
+
+
+_indexes: "OrderedDict[str, T.Tuple[int, int, _LineIndex]]" = OrderedDict()
+_indexes_mutex = thr.Lock()
+
+
+def _index(path: str, st: os.stat_result, mm: mmap.mmap) -> _LineIndex:
+    with _indexes_mutex:
+        entry = _indexes.get(path)
+        if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+            _indexes.move_to_end(path)
+            return entry[2]
+
+    index = _LineIndex(mm, st.st_size)
+    with _indexes_mutex:
+        _indexes[path] = (st.st_mtime_ns, st.st_size, index)
+        while len(_indexes) > INDEXES:
+            _indexes.popitem(last=False)
+    return index
 
-def _is_text_file(path: pathlib.Path) -> bool:
+
+def _is_text(head: bytes) -> bool:
+    if b"\0" in head:
+        return False
     try:
-        with open(path, "rb") as f:
-            chunk = f.read(1024)
-            chunk.decode("utf-8")
+        # Not final, the sample may end in the middle of a character.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
         return True
     except UnicodeDecodeError:
         return False
-    except Exception as e:
-        return False
 
 
-def _view_text(path: pathlib.Path, offset: int):
+def _view_text(path: str, st: os.stat_result, mm: mmap.mmap, offset: int):
+    index = _index(path, st, mm)
+    if offset < 0:
+        offset = max(0, index.lines + offset)
+    if offset >= index.lines:
+        return {"success": False, "error": f"Offset {offset} past end of file ({index.lines} lines)"}
+
     lines = []
-    with open(path, "r") as f:
-        while offset:
-            f.readline()
-            offset -= 1
+    pos = index.seek(mm, offset)
+    for i in range(offset, min(offset + LINES_COUNT, index.lines)):
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = st.st_size
+        lines.append(f"{i}|{mm[pos:end].decode(errors='replace')}")
+        pos = end + 1
+
+    return {"success": True, "output": "\n".join(lines), "lines": index.lines}
 
-        lines_read = 0
-        while ((line := f.readline()) and lines_read < LINES_COUNT):
-            lines.append(f"{offset + lines_read}|{line}")
-            lines_read += 1
 
-    return {"success": True, "output": "\n".join(lines)}
+def _view_bytes(st: os.stat_result, mm: mmap.mmap, offset: int):
+    if offset < 0:
+        offset = max(0, st.st_size + offset)
+    if offset >= st.st_size:
+        return {"success": False, "error": f"Offset {offset} past end of file ({st.st_size} bytes)"}
+    offset -= offset % 16
+
+    rows = []
+    data = mm[offset : offset + HEX_BYTES]
+    for i in range(0, len(data), 16):
+        row = data[i : i + 16]
+        txt = "".join(chr(c) if 32 <= c < 127 else "." for c in row)
+        rows.append(f"{offset + i:08x}  {row.hex(' '):<47}  |{txt}|")
+
+    return {"success": True, "output": "\n".join(rows), "size": st.st_size}
 
 
 def view(path: str, offset: int):
@@ -37,23 +122,38 @@ def view(path: str, offset: int):
     if not p.is_file():
         return {"success": False, "error": "Path is not a file"}
 
-    if _is_text_file(p):
-        return _view_text(p, offset)
-    else:
-        return {"success": False, "error": "Reading binary files is not supported"}
+    try:
+        with open(p, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return {"success": True, "output": "", "lines": 0}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if _is_text(mm[:1024]):
+                    return _view_text(path_scope(path), st, mm, offset)
+                return _view_bytes(st, mm, offset)
+    except Exception as e:
+        return {"success": False, "error": f"{e.__class__.__name__} - {e}"}
+
+
+def _cache_key(path: str, offset: int):
+    scope = path_scope(path)
+    st = os.stat(scope)
+    return scope, offset, st.st_mtime_ns, st.st_size
 
 
 class ViewFunction(Function):
     FUNCTION_t = FunctionType(
         "view",
-        "Views the content of a file (text or binary). Line numbers start at 0.",
+        "Views the content of a file, text by line and binary as a hexdump. Line numbers start at 0.",
         [
             FunctionType.ParamLiteral("path", "string", "Path to the file."),
             FunctionType.ParamLiteral(
                 "offset",
                 "integer",
-                "Starting offset (line number for text, byte for binary). If unsure set to 0.",
+                "Starting offset (line number for text, byte for binary), negative counts from the end "
+                "(e.g. -100 for the last 100 lines). If unsure set to 0.",
             ),
         ],
     )
     CALLABLE = view
+    CACHE_KEY = _cache_key
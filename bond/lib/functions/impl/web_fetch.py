@@ -1,35 +1,64 @@
+import typing as T
+
 import html2text
 import requests
 
 from bond.lib.functions.interface import FunctionType, Function
+from bond.lib.functions.web import get_client
+
+
+def _render(fetched) -> str:
+    text = fetched.text()
+    if "text/html" in fetched.content_type:
+        h = html2text.HTML2Text()
+        h.ignore_links = False
+        text = h.handle(text)
+    if fetched.truncated:
+        text += f"\n[Truncated after {len(fetched.body)} bytes]"
+    return text
+
 
+def web_fetch(urls: T.List[str], prompt: str) -> dict:
+    if not urls:
+        return {"success": False, "output": "", "error": "No URLs given"}
 
-def web_fetch(url: str, prompt: str) -> dict:
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        content_type = response.headers.get("Content-Type", "")
-        if "text/html" in content_type:
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            markdown_content = h.handle(response.text)
-            output = markdown_content
-        else:
-            output = response.text
-        return {"success": True, "output": output, "error": ""}
+    outputs, errors, results = [], [], []
+    for url, fetched in zip(urls, get_client().fetch_all(urls)):
+        if isinstance(fetched, Exception):
+            if isinstance(fetched, requests.exceptions.RequestException):
+                error = f"Error fetching URL {url}: {fetched}"
+            else:
+                error = f"Error fetching URL {url}: {fetched.__class__.__name__} - {fetched}"
+            errors.append(error)
+            results.append({"url": url, "success": False})
+            outputs.append(error)
+            continue
+        outputs.append(_render(fetched))
+        results.append(
+            {
+                "url": url,
+                "success": True,
+                "status": fetched.status,
+                "bytes": len(fetched.body),
+                "cached": fetched.cached,
+                "truncated": fetched.truncated,
+            }
+        )
 
-    except requests.exceptions.RequestException as e:
-        return {"success": False, "output": "", "error": f"Error fetching URL {url}: {e}"}
-    except Exception as e:
-        return {"success": False, "output": "", "error": f"An unexpected error occurred: {e}"}
+    if len(urls) == 1:
+        output = "" if errors else outputs[0]
+    else:
+        output = "\n\n".join(f"# {url}\n\n{out}" for url, out in zip(urls, outputs))
+    return {"success": not errors, "output": output, "error": "\n".join(errors), "results": results}
 
 
 class WebFetchFunction(Function):
     FUNCTION_t = FunctionType(
         "web_fetch",
-        "Fetches content from a specified URL and converts HTML to Markdown. Takes a URL and a prompt as input.",
+        "Fetches content from one or more URLs concurrently and converts HTML to Markdown. Only text content is "
+        "fetched and long pages are truncated. With several URLs each page is preceded by a `# <url>` heading.",
         [
-            FunctionType.ParamLiteral("url", "string", "The URL to fetch."),
+            FunctionType.ParamArray("urls", "string", "The URLs to fetch."),
             FunctionType.ParamLiteral(
                 "prompt",
                 "string",
@@ -37,4 +66,6 @@ class WebFetchFunction(Function):
             ),
         ],
     )
-    CALLABLE = web_fetch
\ No newline at end of file
+    CALLABLE = web_fetch
+    CACHE_KEY = lambda urls, **_: (" ".join(urls), tuple(urls))
+    CACHE_TTL = 300
@@ -55,4 +55,6 @@ class WebSearchFunction(Function):
             FunctionType.ParamLiteral("query", "string", "A string used for searching."),
         ],
     )
-    CALLABLE = web_search
\ No newline at end of file
+    CALLABLE = web_search
+    CACHE_KEY = lambda query, **_: (query, query)
+    CACHE_TTL = 300
\ No newline at end of file
@@ -4,6 +4,18 @@ from bond.lib.llm.interface import FunctionType
 class Function:
     FUNCTION_t: FunctionType
     CALLABLE: T.Callable
+    # Optional coroutine variant used by the async agent, CALLABLE runs on an executor otherwise.
+    ACALLABLE: T.Optional[T.Callable[..., T.Awaitable[T.Any]]] = None
+    # Max number of concurrent calls of this function within one batch, None for no limit.
+    CONCURRENCY: T.Optional[int] = None
+    # Read-only functions return (scope, key) from this to have their results
+    # memoized, scope being the path or URL the result depends on, None to skip.
+    CACHE_KEY: T.Optional[T.Callable[..., T.Optional[T.Tuple[str, T.Hashable]]]] = None
+    # Seconds a memoized result stays valid, None for as long as its key matches.
+    CACHE_TTL: T.Optional[float] = None
+    # Paths a call writes to. Calls writing to the same path run one at a time
+    # and memoized results scoped to them are dropped after it runs.
+    WRITES: T.Optional[T.Callable[..., T.List[str]]] = None
 
     @staticmethod
     def autogen(f: T.Callable):
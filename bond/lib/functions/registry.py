@@ -0,0 +1,40 @@
+import typing as T
+
+from bond.lib.llm import wire as wirefmt
+from bond.lib.llm.interface import FunctionType
+from bond.lib.functions.interface import Function
+
+
+class ToolRegistry:
+    """Functions available to an agent, built once and shared by every request.
+
+    Iterates over the FunctionType of each function in registration order, so
+    it can be passed anywhere a list of FunctionType is expected. Backends
+    that recognise it use `encoded` to get their tool schema as a ready to
+    splice JSON array that is converted only once and stays byte-identical
+    between requests.
+    """
+
+    def __init__(self, functions: T.Iterable[T.Type[Function]]) -> None:
+        self.functions: T.Dict[str, T.Type[Function]] = {}
+        for f in functions:
+            if f.FUNCTION_t.name in self.functions:
+                raise ValueError(f"Duplicate function: {f.FUNCTION_t.name}")
+            self.functions[f.FUNCTION_t.name] = f
+
+        self._types = tuple(f.FUNCTION_t for f in self.functions.values())
+        self._encoded: T.Dict[T.Callable[[FunctionType], T.Any], bytes] = {}
+
+    def __iter__(self) -> T.Iterator[FunctionType]:
+        return iter(self._types)
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def names(self) -> T.List[str]:
+        return list(self.functions.keys())
+
+    def encoded(self, convert: T.Callable[[FunctionType], T.Any]) -> bytes:
+        if convert not in self._encoded:
+            self._encoded[convert] = wirefmt.array(wirefmt.encode(convert(f)) for f in self._types)
+        return self._encoded[convert]
@@ -0,0 +1,227 @@
+import typing as T
+import os
+import re
+import time
+import uuid
+import shlex
+import atexit
+import signal
+import selectors
+import subprocess
+import contextvars
+import threading as thr
+
+from bond.config import Config
+from bond.lib.functions.capture import Capture, result
+
+# Chat thread the running function calls belong to, set by the agent for each step.
+current_thread: "contextvars.ContextVar[T.Optional[str]]" = contextvars.ContextVar("bond_thread", default=None)
+
+# Time a timed out command gets to return once its processes are killed
+# before the shell itself is restarted.
+GRACE = 1.0
+READ_SIZE = 1 << 16
+
+
+def _session_pids(sid: int) -> T.Optional[T.List[int]]:
+    """Processes of session `sid` other than its leader, None when /proc is not available."""
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    pids = []
+    for entry in entries:
+        if not entry.isdigit() or int(entry) == sid:
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # state, ppid, pgrp, session, ...
+        if len(fields) > 3 and int(fields[3]) == sid:
+            pids.append(int(entry))
+    return pids
+
+
+class ShellSession:
+    """A long-lived shell that runs one command at a time.
+
+    Each command is followed by a sentinel that carries its exit code and the
+    working directory, so `cd` and `export` carry over between calls. A command
+    that times out has its processes killed, the shell is only restarted when
+    that is not enough (e.g. a builtin looping forever).
+    """
+
+    def __init__(self, program: T.List[str]) -> None:
+        self.program = program
+        self.process: T.Optional[subprocess.Popen] = None
+        self._mutex = thr.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        self.process = subprocess.Popen(
+            self.program,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={},
+            start_new_session=True,
+        )
+        return self.process
+
+    def interrupt(self) -> bool:
+        """Kills whatever the shell is running, False if that is not possible without killing the shell."""
+        process = self.process
+        if process is None:
+            return True
+        pids = _session_pids(process.pid)
+        if pids is None:
+            return False
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        return True
+
+    def close(self) -> None:
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        for f in (process.stdin, process.stdout, process.stderr):
+            if f is not None:
+                f.close()
+
+    def run(self, args: T.List[str], timeout: float, out: Capture, err: Capture) -> dict:
+        with self._mutex:
+            return self._run(args, timeout, out, err)
+
+    def _run(self, args: T.List[str], timeout: float, out: Capture, err: Capture) -> dict:
+        process = self.process
+        if process is None or process.poll() is not None:
+            process = self._start()
+        assert process.stdin is not None and process.stdout is not None and process.stderr is not None
+
+        token = f"__bond_{uuid.uuid4().hex}__"
+        script = (
+            f"{{ {shlex.join(args)}\n}} < /dev/null\n"
+            f"__bond_rc=$?; printf '\\n{token} %d %s\\n' $__bond_rc \"$PWD\"; printf '\\n{token}\\n' >&2\n"
+        )
+        try:
+            process.stdin.write(script.encode())
+            process.stdin.flush()
+        except BrokenPipeError:
+            self.close()
+            return result(-1, out, err, "Shell session exited")
+
+        marker = f"\n{token}".encode()
+        rx = re.compile(re.escape(marker) + rb" (-?\d+) (.*)\n")
+        out_fd, err_fd = process.stdout.fileno(), process.stderr.fileno()
+        captures = {out_fd: out, err_fd: err}
+        # Bytes that may be the start of the sentinel are held back from the
+        # captures, once it is seen they hold the sentinel itself.
+        pending = {out_fd: b"", err_fd: b""}
+        found: T.Set[int] = set()
+        note = ""
+
+        def complete() -> bool:
+            return len(found) == 2 and rx.match(pending[out_fd]) is not None
+
+        deadline = time.monotonic() + timeout
+        timed_out = exited = False
+        with selectors.DefaultSelector() as sel:
+            for fd in captures:
+                sel.register(fd, selectors.EVENT_READ)
+            while not exited and not complete():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if timed_out or not self.interrupt():
+                        self.close()
+                        note = "shell session restarted"
+                        break
+                    timed_out = True
+                    deadline = time.monotonic() + GRACE
+                    continue
+
+                for key, _ in sel.select(remaining):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        exited = True
+                        break
+                    buf = pending[key.fd] + data
+                    if key.fd in found:
+                        pending[key.fd] = buf
+                        continue
+                    i = buf.find(marker)
+                    if i != -1:
+                        found.add(key.fd)
+                    else:
+                        i = max(0, len(buf) - len(marker) + 1)
+                    captures[key.fd].write(buf[:i])
+                    pending[key.fd] = buf[i:]
+
+        code, cwd = -1, ""
+        m = rx.match(pending[out_fd])
+        if m is not None:
+            code, cwd = int(m.group(1)), m.group(2).decode(errors="replace")
+        for fd in captures:
+            if fd not in found:
+                captures[fd].write(pending[fd])
+        if exited:
+            code = process.wait()
+            self.close()
+            note = "shell session exited"
+        if timed_out:
+            code = -1
+            note = f"Command timed out after {timeout} seconds" + (f", {note}" if note else "")
+
+        res = result(code, out, err, note)
+        res["cwd"] = cwd
+        return res
+
+
+_conf: T.Dict[str, T.Any] = {}
+_sessions: T.Dict[str, ShellSession] = {}
+_sessions_mutex = thr.Lock()
+
+
+def configure(config: Config) -> None:
+    """Reads the `[shell]` table: enabled (false), program (["bash", "--noprofile", "--norc"])."""
+    global _conf
+    _conf = config.get("shell", {}) or {}
+
+
+def enabled() -> bool:
+    return bool(_conf.get("enabled", False))
+
+
+def get_session(thread: str) -> ShellSession:
+    """The shell session of chat `thread`, started on first use."""
+    with _sessions_mutex:
+        if thread not in _sessions:
+            _sessions[thread] = ShellSession(list(_conf.get("program", ["bash", "--noprofile", "--norc"])))
+        return _sessions[thread]
+
+
+def close_session(thread: str) -> None:
+    """Stops the shell session of chat `thread`, if it has one."""
+    with _sessions_mutex:
+        session = _sessions.pop(thread, None)
+    if session is not None:
+        session.close()
+
+
+def close_sessions() -> None:
+    with _sessions_mutex:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_sessions)
@@ -0,0 +1,213 @@
+import typing as T
+import json
+import time
+import hashlib
+import pathlib
+import threading as thr
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bond.config import Config
+from bond.lib.diskcache import DiskLRU
+
+USER_AGENT = "Mozilla/5.0 (compatible; bond)"
+READ_SIZE = 1 << 16
+TEXT_TYPES = ("application/json", "application/xml", "application/javascript", "application/x-sh", "application/toml", "application/yaml")
+
+ENTRY_t = T.Tuple[T.Dict[str, T.Any], bytes]
+
+
+def is_text(content_type: str) -> bool:
+    ctype = content_type.split(";", 1)[0].strip().lower()
+    return (
+        not ctype
+        or ctype.startswith("text/")
+        or ctype in TEXT_TYPES
+        or ctype.endswith(("+json", "+xml"))
+    )
+
+
+def _cache_control(headers: T.Mapping[str, str]) -> T.Dict[str, str]:
+    out = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        k, _, v = part.strip().partition("=")
+        if k:
+            out[k.lower()] = v.strip('"')
+    return out
+
+
+def _expires(headers: T.Mapping[str, str], now: float) -> T.Optional[float]:
+    """When a response stops being fresh, None if it must not be stored at all."""
+    cc = _cache_control(headers)
+    if "no-store" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    try:
+        if "max-age" in cc:
+            return now + int(cc["max-age"]) - int(headers.get("Age", 0))
+        if "Expires" in headers:
+            return parsedate_to_datetime(headers["Expires"]).timestamp()
+    except (ValueError, TypeError):
+        pass
+    # No explicit freshness, served only after revalidation.
+    return 0.0
+
+
+class HTTPCache(DiskLRU):
+    """On-disk cache of GET responses, one file per URL.
+
+    Files live under `<path>/<key[:2]>/<key>` and hold a JSON line of metadata
+    (validators, content type, freshness) followed by the body. Like the
+    replay cache, the least recently used files go once the cache grows past
+    `max_bytes`.
+    """
+
+    def _file(self, url: str) -> pathlib.Path:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.path / key[:2] / key
+
+    def get(self, url: str) -> T.Optional[ENTRY_t]:
+        data = self._read(self._file(url))
+        if data is None:
+            return None
+        line, _, body = data.partition(b"\n")
+        try:
+            meta = json.loads(line)
+        except ValueError:
+            return None
+        if meta.get("url") != url:
+            return None
+        return meta, body
+
+    def put(self, url: str, meta: T.Dict[str, T.Any], body: bytes) -> None:
+        self._write(self._file(url), json.dumps(dict(meta, url=url)).encode() + b"\n" + body)
+
+
+class Fetched:
+    def __init__(self, url: str, status: int, content_type: str, body: bytes, cached: bool, truncated: bool) -> None:
+        self.url = url
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.cached = cached
+        self.truncated = truncated
+
+    def text(self) -> str:
+        charset = "utf-8"
+        for part in self.content_type.split(";")[1:]:
+            k, _, v = part.strip().partition("=")
+            if k.lower() == "charset" and v:
+                charset = v.strip('"')
+        try:
+            return self.body.decode(charset, errors="replace")
+        except LookupError:
+            return self.body.decode("utf-8", errors="replace")
+
+
+class WebClient:
+    """Keep-alive HTTP client shared by the web functions.
+
+    Config lives under the `[web_fetch]` table:
+      max_bytes (2 MiB per response), timeout (10), concurrency (8),
+      cache (true), cache_path (".bond/http_cache"), cache_max_bytes (64 MiB).
+    Responses are streamed and cut at `max_bytes`; anything that is not text
+    is abandoned as soon as its headers are in.
+    """
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("web_fetch", {}) or {}
+        self.max_bytes = int(conf.get("max_bytes", 2 * 1024 * 1024))
+        self.timeout = float(conf.get("timeout", 10))
+        self.concurrency = int(conf.get("concurrency", 8))
+        self.cache: T.Optional[HTTPCache] = None
+        if conf.get("cache", True):
+            path = pathlib.Path(conf.get("cache_path", ".bond/http_cache")).expanduser()
+            self.cache = HTTPCache(path, int(conf.get("cache_max_bytes", 64 * 1024 * 1024)))
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bond-web")
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def fetch(self, url: str) -> Fetched:
+        now = time.time()
+        entry = self.cache.get(url) if self.cache is not None else None
+        headers = {}
+        if entry is not None:
+            meta, body = entry
+            if meta["expires"] > now:
+                self.hits += 1
+                return Fetched(url, 200, meta["content_type"], body, True, False)
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 304 and entry is not None:
+                meta, body = entry
+                expires = _expires(r.headers, now)
+                if expires is not None and self.cache is not None:
+                    self.cache.put(url, dict(meta, expires=expires), body)
+                self.revalidated += 1
+                return Fetched(url, 200, meta["content_type"], body, True, False)
+
+            self.misses += 1
+            r.raise_for_status()
+            content_type = r.headers.get("Content-Type", "")
+            if not is_text(content_type):
+                raise ValueError(f"Unsupported content type: {content_type}")
+
+            data = bytearray()
+            truncated = False
+            for chunk in r.iter_content(READ_SIZE):
+                room = self.max_bytes - len(data)
+                data += chunk[:room]
+                if len(chunk) > room:
+                    truncated = True
+                    break
+
+            expires = _expires(r.headers, now)
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            if self.cache is not None and not truncated and r.status_code == 200 and expires is not None:
+                if expires > now or etag or last_modified:
+                    meta = {"content_type": content_type, "expires": expires, "etag": etag, "last_modified": last_modified}
+                    self.cache.put(url, meta, bytes(data))
+            return Fetched(url, r.status_code, content_type, bytes(data), False, truncated)
+
+    def fetch_all(self, urls: T.List[str]) -> T.List[T.Union[Fetched, Exception]]:
+        """Fetches `urls` concurrently, failures come back in place of their result."""
+
+        def one(url: str) -> T.Union[Fetched, Exception]:
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                return e
+
+        return list(self._pool.map(one, urls))
+
+    def stats(self) -> T.Dict[str, int]:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+_client: T.Optional[WebClient] = None
+_client_mutex = thr.Lock()
+
+
+def get_client(config: T.Optional[Config] = None) -> WebClient:
+    """Returns the process wide client, created from `config` on first use."""
+    global _client
+    with _client_mutex:
+        if _client is None:
+            _client = WebClient(config if config is not None else Config({}))
+        return _client
@@ -0,0 +1,45 @@
+import typing as T
+
+from bond.config import Config
+from bond.lib.llm.interface import LLM
+
+
+def make_backend(conf: Config) -> LLM:
+    name = conf["provider"]["name"]
+    if name == "gemini":
+        from bond.lib.llm.impl.gemini_oai import GeminiLLM
+
+        return GeminiLLM(conf)
+    elif name == "openai":
+        from bond.lib.llm.impl.openai import OpenAILLM
+
+        return OpenAILLM(conf)
+    raise ValueError(f"Unknown provider: {name}")
+
+
+def make_llm(conf: Config) -> LLM:
+    """Builds the LLM for `conf`.
+
+    With several `[[providers]]` tables the backends are wrapped in a
+    HedgedLLM, the first one being the primary. `[provider]` defaults to it.
+    """
+    providers: T.List[T.Dict[str, T.Any]] = conf.get("providers", []) or []
+    if providers and not conf.get("provider"):
+        conf["provider"] = providers[0]
+
+    if len(providers) > 1:
+        from bond.lib.llm.impl.hedged import HedgedLLM
+
+        backends = []
+        for i, p in enumerate(providers):
+            backends.append((f"{i}:{p['name']}/{p.get('model', '')}", make_backend(Config({**conf._config, "provider": p}))))
+        llm = HedgedLLM(conf, backends)
+    else:
+        llm = make_backend(conf)
+
+    if conf.get("replay"):
+        from bond.lib.llm.impl.replay import ReplayLLM
+
+        llm = ReplayLLM(conf, llm)
+
+    return llm
@@ -0,0 +1,384 @@
+import typing as T
+import json
+import time
+import threading as thr
+from contextlib import contextmanager, asynccontextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from bond.config import Config
+
+_local = thr.local()
+
+
+class Timing:
+    def __init__(self, connect: float = 0.0, ttfb: float = 0.0, download: float = 0.0) -> None:
+        self.connect = connect
+        self.ttfb = ttfb
+        self.download = download
+
+    @property
+    def total(self) -> float:
+        return self.connect + self.ttfb + self.download
+
+    def __repr__(self) -> str:
+        return (
+            f"Timing(connect={self.connect * 1000:.1f}ms, ttfb={self.ttfb * 1000:.1f}ms, "
+            f"download={self.download * 1000:.1f}ms)"
+        )
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+
+    def add(self, timing: Timing) -> None:
+        self.requests += 1
+        if timing.connect:
+            self.connections += 1
+        self.connect += timing.connect
+        self.ttfb += timing.ttfb
+        self.download += timing.download
+
+    def as_dict(self) -> T.Dict[str, T.Any]:
+        return dict(self.__dict__)
+
+
+class Response:
+    def __init__(self, status_code: int, headers: T.Mapping[str, str], content: bytes, timing: Timing) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.timing = timing
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> T.Any:
+        return json.loads(self.content)
+
+
+class AsyncStreamResponse:
+    def __init__(self, status_code: int, headers: T.Mapping[str, str], lines: T.AsyncIterator[str], read: T.Callable[[], T.Awaitable[bytes]]) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self._lines = lines
+        self._read = read
+
+    def aiter_lines(self) -> T.AsyncIterator[str]:
+        return self._lines
+
+    async def read(self) -> bytes:
+        return await self._read()
+
+    async def text(self) -> str:
+        return (await self.read()).decode("utf-8", errors="replace")
+
+
+class StreamResponse:
+    def __init__(self, status_code: int, headers: T.Mapping[str, str], lines: T.Iterator[str], read: T.Callable[[], bytes]) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self._lines = lines
+        self._read = read
+
+    def iter_lines(self) -> T.Iterator[str]:
+        return self._lines
+
+    def read(self) -> bytes:
+        return self._read()
+
+    @property
+    def text(self) -> str:
+        return self.read().decode("utf-8", errors="replace")
+
+
+class SSEDecoder:
+    """Incremental server-sent events decoder, fed one line at a time."""
+
+    def __init__(self) -> None:
+        self.done = False
+        self._data: T.List[str] = []
+
+    def feed(self, line: str) -> T.Optional[str]:
+        if line.endswith("\r"):
+            line = line[:-1]
+        if line == "":
+            return self.flush()
+        if line.startswith("data:"):
+            self._data.append(line[5:].lstrip(" "))
+        return None
+
+    def flush(self) -> T.Optional[str]:
+        if not self._data:
+            return None
+        payload = "\n".join(self._data)
+        self._data = []
+        if payload == "[DONE]":
+            self.done = True
+            return None
+        return payload
+
+
+def iter_sse(lines: T.Iterable[str]) -> T.Iterator[str]:
+    """Yields the `data` field of every server-sent event until `[DONE]`."""
+    decoder = SSEDecoder()
+    for line in lines:
+        event = decoder.feed(line)
+        if decoder.done:
+            return
+        if event is not None:
+            yield event
+    event = decoder.flush()
+    if event is not None:
+        yield event
+
+
+async def aiter_sse(lines: T.AsyncIterable[str]) -> T.AsyncIterator[str]:
+    decoder = SSEDecoder()
+    async for line in lines:
+        event = decoder.feed(line)
+        if decoder.done:
+            return
+        if event is not None:
+            yield event
+    event = decoder.flush()
+    if event is not None:
+        yield event
+
+
+# urllib3 creates a connection object per socket and only calls connect() when
+# the pool has no idle keep-alive socket left, so timing connect() here gives us
+# exactly the handshake cost (TCP + TLS) of the request that paid for it.
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        t = time.perf_counter()
+        super().connect()
+        _local.connect = getattr(_local, "connect", 0.0) + time.perf_counter() - t
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        t = time.perf_counter()
+        super().connect()
+        _local.connect = getattr(_local, "connect", 0.0) + time.perf_counter() - t
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _connect_time(marks: T.Dict[str, float], default: float) -> float:
+    if "connection.connect_tcp.started" not in marks:
+        return 0.0
+    end = marks.get("connection.start_tls.complete", marks.get("connection.connect_tcp.complete", default))
+    return end - marks["connection.connect_tcp.started"]
+
+
+class HTTPSession:
+    """Pooled keep-alive HTTP client owned by a single LLM instance.
+
+    Config lives under the `[http]` table:
+      pool_size (10), connect_timeout (10), read_timeout (300), http2 (false).
+    HTTP/2 needs the optional `httpx[http2]` dependency.
+    """
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("http", {}) or {}
+        self.pool_size = int(conf.get("pool_size", 10))
+        self.connect_timeout = float(conf.get("connect_timeout", 10))
+        self.read_timeout = float(conf.get("read_timeout", 300))
+        self.http2 = bool(conf.get("http2", False))
+
+        self.last_timing = Timing()
+        self.stats = Stats()
+        self._stats_mutex = thr.Lock()
+
+        if self.http2:
+            import httpx
+
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+        else:
+            self._client = requests.Session()
+            adapter = _TimedAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            self._client.mount("https://", adapter)
+            self._client.mount("http://", adapter)
+
+    def _record(self, timing: Timing) -> None:
+        self.last_timing = timing
+        with self._stats_mutex:
+            self.stats.add(timing)
+
+    def post(self, url: str, headers: T.Dict[str, str], data: bytes) -> Response:
+        if self.http2:
+            return self._post_httpx(url, headers, data)
+
+        _local.connect = 0.0
+        t = time.perf_counter()
+        resp = self._client.post(
+            url,
+            headers=headers,
+            data=data,
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=True,
+        )
+        t_headers = time.perf_counter()
+        content = resp.content
+        t_done = time.perf_counter()
+
+        connect = _local.connect
+        timing = Timing(connect, t_headers - t - connect, t_done - t_headers)
+        self._record(timing)
+        return Response(resp.status_code, resp.headers, content, timing)
+
+    def _post_httpx(self, url: str, headers: T.Dict[str, str], data: bytes) -> Response:
+        marks: T.Dict[str, float] = {}
+
+        def trace(name: str, info: T.Any):
+            marks[name] = time.perf_counter()
+
+        t = time.perf_counter()
+        with self._client.stream(
+            "POST", url, headers=headers, content=data, extensions={"trace": trace}
+        ) as resp:
+            t_headers = time.perf_counter()
+            content = resp.read()
+        t_done = time.perf_counter()
+
+        connect = _connect_time(marks, t)
+        timing = Timing(connect, t_headers - t - connect, t_done - t_headers)
+        self._record(timing)
+        return Response(resp.status_code, resp.headers, content, timing)
+
+    @contextmanager
+    def stream(self, url: str, headers: T.Dict[str, str], data: bytes) -> T.Iterator[StreamResponse]:
+        if self.http2:
+            with self._stream_httpx(url, headers, data) as resp:
+                yield resp
+            return
+
+        _local.connect = 0.0
+        t = time.perf_counter()
+        resp = self._client.post(
+            url,
+            headers=headers,
+            data=data,
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=True,
+        )
+        t_headers = time.perf_counter()
+        connect = _local.connect
+        try:
+            lines = (x.decode("utf-8") for x in resp.iter_lines(chunk_size=None, delimiter=b"\n"))
+            yield StreamResponse(resp.status_code, resp.headers, lines, lambda: resp.content)
+        finally:
+            resp.close()
+            self._record(Timing(connect, t_headers - t - connect, time.perf_counter() - t_headers))
+
+    @contextmanager
+    def _stream_httpx(self, url: str, headers: T.Dict[str, str], data: bytes) -> T.Iterator[StreamResponse]:
+        marks: T.Dict[str, float] = {}
+
+        def trace(name: str, info: T.Any):
+            marks[name] = time.perf_counter()
+
+        t = time.perf_counter()
+        with self._client.stream(
+            "POST", url, headers=headers, content=data, extensions={"trace": trace}
+        ) as resp:
+            t_headers = time.perf_counter()
+            try:
+                yield StreamResponse(resp.status_code, resp.headers, resp.iter_lines(), resp.read)
+            finally:
+                connect = _connect_time(marks, t)
+                self._record(Timing(connect, t_headers - t - connect, time.perf_counter() - t_headers))
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class AsyncHTTPSession:
+    """asyncio counterpart of HTTPSession, built on the optional `httpx` dependency.
+
+    Uses the same `[http]` config table. Creating it raises ImportError when
+    httpx is not installed.
+    """
+
+    def __init__(self, config: Config) -> None:
+        import httpx
+
+        conf = config.get("http", {}) or {}
+        self.pool_size = int(conf.get("pool_size", 10))
+        self.connect_timeout = float(conf.get("connect_timeout", 10))
+        self.read_timeout = float(conf.get("read_timeout", 300))
+        self.http2 = bool(conf.get("http2", False))
+
+        self.last_timing = Timing()
+        self.stats = Stats()
+
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        )
+
+    def _record(self, timing: Timing) -> None:
+        self.last_timing = timing
+        self.stats.add(timing)
+
+    async def post(self, url: str, headers: T.Dict[str, str], data: bytes) -> Response:
+        async with self.stream(url, headers, data) as resp:
+            content = await resp.read()
+        return Response(resp.status_code, resp.headers, content, self.last_timing)
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: T.Dict[str, str], data: bytes) -> T.AsyncIterator[AsyncStreamResponse]:
+        marks: T.Dict[str, float] = {}
+
+        async def trace(name: str, info: T.Any):
+            marks[name] = time.perf_counter()
+
+        t = time.perf_counter()
+        async with self._client.stream(
+            "POST", url, headers=headers, content=data, extensions={"trace": trace}
+        ) as resp:
+            t_headers = time.perf_counter()
+            try:
+                yield AsyncStreamResponse(resp.status_code, resp.headers, resp.aiter_lines(), resp.aread)
+            finally:
+                connect = _connect_time(marks, t)
+                self._record(Timing(connect, t_headers - t - connect, time.perf_counter() - t_headers))
+
+    async def close(self) -> None:
+        await self._client.aclose()
@@ -0,0 +1,241 @@
+import typing as T
+import time
+import asyncio
+
+from bond.config import Config
+from bond.lib.llm.interface import (
+    LLM,
+    MSG_t,
+    ROLE_t,
+    FunctionType,
+    ErorrMsg,
+    DELTA_t,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
+)
+
+from bond.lib.llm import wire as wirefmt
+from bond.lib.functions.registry import ToolRegistry
+from bond.lib.llm.ratelimit import get_limiter
+from bond.lib.trace import span
+from bond.lib.llm.http import HTTPSession, AsyncHTTPSession, Response, iter_sse, aiter_sse
+
+
+def translate_role(role: ROLE_t):
+    if role == "system":
+        return "system"
+    elif role == "user":
+        return "user"
+    elif role == "llm":
+        return "assistant"
+    else:
+        raise RuntimeError(f"Unknown role: {role}")
+
+
+class StreamParser:
+    def feed(self, event: str) -> T.List[DELTA_t]:
+        raise NotImplementedError()
+
+    def finish(self) -> T.List[MSG_t]:
+        raise NotImplementedError()
+
+
+class ChatCompletionsLLM(LLM):
+    """Transport shared by the OpenAI style chat completion backends.
+
+    Handles the payload, connection pools, rate limiting and retries for
+    send/stream/asend/astream. Backends only supply their wire format:
+    `encode_msg`, `convert_function` with the `FUNCTIONS`/`FUNCTION_CHOICE`
+    fields it goes into, `_parse` for a whole response and `STREAM_PARSER`
+    for a streamed one.
+    """
+
+    ENDPOINT = ""
+    FUNCTIONS = "tools"
+    FUNCTION_CHOICE = "tool_choice"
+    STREAM_PARSER: T.Type[StreamParser] = StreamParser
+
+    def __init__(self, config: Config) -> None:
+        super().__init__(config)
+        self.api_key = self.config["provider"]["api_key"]
+        self.model = self.config["provider"]["model"]
+
+        self.HEADERS = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        self.endpoint = self.config["provider"].get("endpoint", self.ENDPOINT)
+        self.http = HTTPSession(config)
+        self.limiter = get_limiter(config, f"{self.endpoint}|{self.api_key}")
+        self._ahttp: T.Optional[AsyncHTTPSession] = None
+        self._ahttp_missing = False
+
+    @staticmethod
+    def convert_function(f: FunctionType) -> T.Dict[str, T.Any]:
+        raise NotImplementedError()
+
+    def _parse(self, j: T.Dict[str, T.Any]) -> T.List[MSG_t]:
+        raise NotImplementedError()
+
+    def ahttp(self) -> T.Optional[AsyncHTTPSession]:
+        if self._ahttp is None and not self._ahttp_missing:
+            try:
+                self._ahttp = AsyncHTTPSession(self.config)
+            except ImportError:
+                self._ahttp_missing = True
+        return self._ahttp
+
+    def encode_functions(self, functions: T.Iterable[FunctionType]) -> bytes:
+        if isinstance(functions, ToolRegistry):
+            return functions.encoded(self.convert_function)
+        return wirefmt.encode([self.convert_function(f) for f in functions])
+
+    def _payload(
+        self,
+        messages: T.List[MSG_t],
+        functions: T.List[FunctionType],
+        wire: T.Optional[T.List[bytes]] = None,
+        stream: bool = False,
+    ) -> bytes:
+        if wire is None:
+            wire = [self.encode_msg(m) for m in messages]
+
+        fields = [
+            ("model", wirefmt.encode(self.model)),
+            ("messages", wirefmt.array(wire)),
+        ]
+
+        if functions:
+            fields.append((self.FUNCTIONS, self.encode_functions(functions)))
+            fields.append((self.FUNCTION_CHOICE, wirefmt.encode("auto")))
+
+        if stream:
+            fields.append(("stream", wirefmt.encode(True)))
+
+        payload = wirefmt.obj(fields)
+
+        if self.config.get("debug", False):
+            print("SENDING", payload.decode())
+
+        return payload
+
+    def _result(self, resp: Response) -> T.List[MSG_t]:
+        if self.config.get("debug", False):
+            print("TIMING", resp.timing)
+
+        if resp.status_code != 200:
+            return [ErorrMsg(f"Response status code: {resp.status_code} != 200", resp.text)]
+        return self._parse(resp.json())
+
+    def send(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        with span("llm.serialize"):
+            payload = self._payload(messages, functions, wire)
+        attempt = 0
+        while True:
+            with span("llm.ratelimit"):
+                self.limiter.acquire(len(payload) / 4)
+            with span("llm.network", bytes=len(payload)):
+                resp = self.http.post(self.endpoint, self.HEADERS, payload)
+            delay = self.limiter.retry_delay(attempt, resp.status_code, resp.headers)
+            if delay is None:
+                with span("llm.parse"):
+                    return self._result(resp)
+            time.sleep(delay)
+            attempt += 1
+
+    def stream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.Iterator[T.Union[MSG_t, DELTA_t]]:
+        with span("llm.serialize"):
+            payload = self._payload(messages, functions, wire, stream=True)
+        parser = self.STREAM_PARSER()
+        attempt = 0
+        while True:
+            with span("llm.ratelimit"):
+                self.limiter.acquire(len(payload) / 4)
+            # Spans the whole response, including the time the consumer
+            # spends on every yielded delta.
+            with span("llm.stream", bytes=len(payload)), self.http.stream(self.endpoint, self.HEADERS, payload) as resp:
+                delay = self.limiter.retry_delay(attempt, resp.status_code, resp.headers)
+                if delay is None:
+                    if resp.status_code != 200:
+                        yield ErorrMsg(f"Response status code: {resp.status_code} != 200", resp.text)
+                        return
+
+                    for event in iter_sse(resp.iter_lines()):
+                        yield from parser.feed(event)
+                    break
+            time.sleep(delay)
+            attempt += 1
+
+        if self.config.get("debug", False):
+            print("TIMING", self.http.last_timing)
+
+        yield from parser.finish()
+
+    async def asend(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        http = self.ahttp()
+        if http is None:
+            # Sent as a stream on the executor: a cancelled request is closed at
+            # its next chunk instead of running until the model is done.
+            msgs: T.List[MSG_t] = []
+            async for msg in super().astream(messages, functions, wire):
+                if not isinstance(msg, (TextDeltaMsg, FunctionCallDeltaMsg)):
+                    msgs.append(msg)
+            return msgs
+
+        with span("llm.serialize"):
+            payload = self._payload(messages, functions, wire)
+        attempt = 0
+        while True:
+            with span("llm.ratelimit"):
+                await self.limiter.aacquire(len(payload) / 4)
+            with span("llm.network", bytes=len(payload)):
+                resp = await http.post(self.endpoint, self.HEADERS, payload)
+            delay = self.limiter.retry_delay(attempt, resp.status_code, resp.headers)
+            if delay is None:
+                with span("llm.parse"):
+                    return self._result(resp)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def astream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.AsyncIterator[T.Union[MSG_t, DELTA_t]]:
+        http = self.ahttp()
+        if http is None:
+            async for msg in super().astream(messages, functions, wire):
+                yield msg
+            return
+
+        with span("llm.serialize"):
+            payload = self._payload(messages, functions, wire, stream=True)
+        parser = self.STREAM_PARSER()
+        attempt = 0
+        while True:
+            with span("llm.ratelimit"):
+                await self.limiter.aacquire(len(payload) / 4)
+            with span("llm.stream", bytes=len(payload)):
+                async with http.stream(self.endpoint, self.HEADERS, payload) as resp:
+                    delay = self.limiter.retry_delay(attempt, resp.status_code, resp.headers)
+                    if delay is None:
+                        if resp.status_code != 200:
+                            yield ErorrMsg(f"Response status code: {resp.status_code} != 200", await resp.text())
+                            return
+
+                        async for event in aiter_sse(resp.aiter_lines()):
+                            for delta in parser.feed(event):
+                                yield delta
+                        break
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if self.config.get("debug", False):
+            print("TIMING", http.last_timing)
+
+        for msg in parser.finish():
+            yield msg
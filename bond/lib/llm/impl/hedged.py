@@ -0,0 +1,358 @@
+import typing as T
+import math
+import time
+import asyncio
+import threading as thr
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+from bond.config import Config
+from bond.lib.llm.interface import (
+    LLM,
+    MSG_t,
+    DELTA_t,
+    FunctionType,
+    ErorrMsg,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
+)
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram, 1ms to ~15min with ~10% resolution."""
+
+    BASE = 0.001
+    FACTOR = 1.1
+    BUCKETS = 144
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self._mutex = thr.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = 0
+        if seconds > self.BASE:
+            i = min(self.BUCKETS - 1, int(math.log(seconds / self.BASE, self.FACTOR)) + 1)
+        with self._mutex:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+
+    def error(self) -> None:
+        with self._mutex:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        with self._mutex:
+            if not self.count:
+                return 0.0
+            rank = math.ceil(self.count * p / 100)
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    return self.BASE * self.FACTOR**i
+        return self.BASE * self.FACTOR ** (self.BUCKETS - 1)
+
+    def as_dict(self) -> T.Dict[str, T.Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+def _failed(msgs: T.Sequence[MSG_t]) -> bool:
+    return any(isinstance(m, ErorrMsg) for m in msgs)
+
+
+_DONE = object()
+
+
+class _ThreadedStream:
+    """Runs a blocking stream on its own thread so several can be raced."""
+
+    def __init__(
+        self, pool: ThreadPoolExecutor, slots: thr.Semaphore, it: T.Iterator[T.Any], signal: thr.Event
+    ) -> None:
+        self.items: "Queue[T.Any]" = Queue()
+        self.stopped = thr.Event()
+        self.first = thr.Event()
+        self.signal = signal
+        self.slots = slots
+        pool.submit(self._run, it)
+
+    def _started(self) -> None:
+        if not self.first.is_set():
+            self.first.set()
+            self.signal.set()
+
+    def _run(self, it: T.Iterator[T.Any]) -> None:
+        try:
+            for item in it:
+                if self.stopped.is_set():
+                    break
+                self.items.put(item)
+                self._started()
+        except Exception as e:
+            self.items.put(ErorrMsg(f"{e.__class__.__name__} - {e}", e))
+        finally:
+            if hasattr(it, "close"):
+                it.close()
+            self.slots.release()
+            self.items.put(_DONE)
+            self._started()
+
+
+class HedgedLLM(LLM):
+    """Composite LLM that hedges and fails over across several backends.
+
+    Config lives under the `[hedge]` table:
+      percentile (95), min_samples (20), delay (2, used until a backend has
+      min_samples successful requests), max_inflight (32).
+    Requests go to the first backend. If it hasn't produced its first output
+    within its latency percentile, the same request is sent to the next backend
+    and whichever answers first wins. A backend that fails hands the request
+    over to the next one immediately.
+
+    Async losers are cancelled. Blocking requests are raced as streams on a pool
+    of max_inflight threads and a loser is stopped at its next chunk, so one
+    that hasn't started answering (or a backend that can't stream) keeps its
+    thread until then. Hedges only take a free thread: with the pool full, a
+    request waits for the backends it already has instead of queueing more.
+    """
+
+    def __init__(self, config: Config, backends: T.List[T.Tuple[str, LLM]]) -> None:
+        super().__init__(config)
+        if not backends:
+            raise ValueError("HedgedLLM needs at least one backend")
+        self.backends = backends
+
+        conf = config.get("hedge", {}) or {}
+        self.percentile = float(conf.get("percentile", 95))
+        self.min_samples = int(conf.get("min_samples", 20))
+        self.default_delay = float(conf.get("delay", 2))
+
+        self.histograms = {name: LatencyHistogram() for name, _ in backends}
+        max_inflight = int(conf.get("max_inflight", 32))
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="bond-hedge")
+        self._slots = thr.Semaphore(max_inflight)
+
+    def info(self) -> str:
+        return ", ".join(name for name, _ in self.backends)
+
+    def encode_msg(self, msg: MSG_t) -> bytes:
+        return self.backends[0][1].encode_msg(msg)
+
+    def stats(self) -> T.Dict[str, T.Dict[str, T.Any]]:
+        return {name: h.as_dict() for name, h in self.histograms.items()}
+
+    def _delay(self, name: str) -> float:
+        h = self.histograms[name]
+        if h.count < self.min_samples:
+            return self.default_delay
+        return h.percentile(self.percentile)
+
+    def _wire(self, llm: LLM, wire: T.Optional[T.List[bytes]]) -> T.Optional[T.List[bytes]]:
+        # The cached wire encoding comes from the first backend, others only
+        # get it if they encode messages the same way.
+        if wire is not None and type(llm).encode_msg is type(self.backends[0][1]).encode_msg:
+            return wire
+        return None
+
+    def _observe(self, name: str, start: float, ok: bool) -> None:
+        if ok:
+            self.histograms[name].observe(time.monotonic() - start)
+        else:
+            self.histograms[name].error()
+
+    def _abandon(self, name: str, start: float) -> None:
+        # A request that lost the race took at least this long. Dropping it
+        # would leave only the fast answers and pull the hedge delay down.
+        self.histograms[name].observe(time.monotonic() - start)
+
+    def send(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        # Raced as streams so the losers can be stopped.
+        return [
+            m
+            for m in self.stream(messages, functions, wire)
+            if not isinstance(m, (TextDeltaMsg, FunctionCallDeltaMsg))
+        ]
+
+    def stream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.Iterator[T.Union[MSG_t, DELTA_t]]:
+        messages = list(messages)
+        remaining = list(self.backends)
+        racing: T.List[T.Tuple[str, float, _ThreadedStream]] = []
+        signal = thr.Event()
+
+        def launch(block: bool) -> bool:
+            if not self._slots.acquire(blocking=block):
+                return False
+            name, llm = remaining.pop(0)
+            it = llm.stream(messages, functions, self._wire(llm, wire))
+            racing.append((name, time.monotonic(), _ThreadedStream(self._pool, self._slots, it, signal)))
+            return True
+
+        launch(True)
+        winner = None
+        last: T.Any = _DONE
+        deadline = time.monotonic() + self._delay(racing[0][0])
+        while (racing or remaining) and winner is None:
+            signal.clear()
+            for entry in list(racing):
+                name, start, s = entry
+                if not s.first.is_set():
+                    continue
+                first = s.items.queue[0]
+                if first is _DONE or isinstance(first, ErorrMsg):
+                    racing.remove(entry)
+                    self._observe(name, start, False)
+                    last = first
+                    continue
+                self._observe(name, start, True)
+                winner = s
+                break
+            if winner is not None:
+                break
+
+            if remaining and (not racing or time.monotonic() >= deadline):
+                launch(not racing)
+                deadline = time.monotonic() + self._delay(racing[0][0])
+            else:
+                signal.wait(max(0.0, deadline - time.monotonic()) if remaining else None)
+
+        for name, start, s in racing:
+            if s is not winner:
+                s.stopped.set()
+                self._abandon(name, start)
+
+        if winner is None:
+            if last is not _DONE:
+                yield last
+            return
+
+        try:
+            while (item := winner.items.get()) is not _DONE:
+                yield item
+        finally:
+            winner.stopped.set()
+
+    async def _asend_one(self, name: str, llm: LLM, messages, functions, wire) -> T.List[MSG_t]:
+        start = time.monotonic()
+        try:
+            msgs = list(await llm.asend(messages, functions, self._wire(llm, wire)))
+        except asyncio.CancelledError:
+            self._abandon(name, start)
+            raise
+        except Exception as e:
+            msgs = [ErorrMsg(f"{name}: {e.__class__.__name__} - {e}", e)]
+        self._observe(name, start, not _failed(msgs))
+        return msgs
+
+    async def asend(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        messages = list(messages)
+        pending: T.Dict["asyncio.Future[T.List[MSG_t]]", str] = {}
+        remaining = list(self.backends)
+        last: T.List[MSG_t] = []
+
+        def launch() -> None:
+            name, llm = remaining.pop(0)
+            pending[asyncio.ensure_future(self._asend_one(name, llm, messages, functions, wire))] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = self._delay(next(iter(pending.values()))) if remaining else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for f in done:
+                    del pending[f]
+                    msgs = f.result()
+                    if not _failed(msgs):
+                        return msgs
+                    last = msgs
+                if not pending and remaining:
+                    launch()
+            return last
+        finally:
+            for f in pending:
+                f.cancel()
+
+    async def astream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.AsyncIterator[T.Union[MSG_t, DELTA_t]]:
+        messages = list(messages)
+        remaining = list(self.backends)
+        # first item future -> (name, start, stream)
+        pending: T.Dict["asyncio.Future[T.Any]", T.Tuple[str, float, T.AsyncIterator[T.Any]]] = {}
+
+        def launch() -> None:
+            name, llm = remaining.pop(0)
+            it = llm.astream(messages, functions, self._wire(llm, wire)).__aiter__()
+            pending[asyncio.ensure_future(it.__anext__())] = (name, time.monotonic(), it)
+
+        async def close(it: T.AsyncIterator[T.Any]) -> None:
+            aclose = getattr(it, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+        launch()
+        winner = None
+        first: T.Any = None
+        last: T.Optional[MSG_t] = None
+        try:
+            while pending and winner is None:
+                timeout = self._delay(next(iter(pending.values()))[0]) if remaining else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for f in done:
+                    name, start, it = pending.pop(f)
+                    try:
+                        item = f.result()
+                    except StopAsyncIteration:
+                        item = None
+                    except Exception as e:
+                        item = ErorrMsg(f"{name}: {e.__class__.__name__} - {e}", e)
+                    if item is None or isinstance(item, ErorrMsg):
+                        self._observe(name, start, False)
+                        last = item or last
+                        await close(it)
+                        continue
+                    self._observe(name, start, True)
+                    winner, first = it, item
+                    break
+                if winner is None and not pending and remaining:
+                    launch()
+        finally:
+            for f, (name, start, it) in pending.items():
+                f.cancel()
+                self._abandon(name, start)
+                await close(it)
+
+        if winner is None:
+            if last is not None:
+                yield last
+            return
+
+        yield first
+        async for item in winner:
+            yield item
@@ -1,30 +1,20 @@
 import typing as T
 import json
 
-from bond.config import Config
 from bond.lib.llm.interface import (
-    LLM,
     MSG_t,
-    ROLE_t,
     TextMsg,
     FunctionResultMsg,
     FunctionType,
     FunctionCallMsg,
-    ErorrMsg,
+    DELTA_t,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
 )
 
-import requests
-
-
-def translate_role(role: ROLE_t):
-    if role == "system":
-        return "system"
-    elif role == "user":
-        return "user"
-    elif role == "llm":
-        return "assistant"
-    else:
-        raise RuntimeError(f"Unknown role: {role}")
+from bond.lib.llm import wire as wirefmt
+from bond.lib.llm.impl import chat_completions
+from bond.lib.llm.impl.chat_completions import ChatCompletionsLLM, translate_role
 
 
 def convert_msg(msg: MSG_t):
@@ -82,39 +72,51 @@ def convert_function(f: FunctionType):
     }
 
 
-class OpenAILLM(LLM):
-    ENDPOINT = "https://api.openai.com/v1/chat/completions"
+class StreamParser(chat_completions.StreamParser):
+    def __init__(self) -> None:
+        self.content = ""
+        self.fcall: T.Optional[T.Dict[str, str]] = None
 
-    def __init__(self, config: Config) -> None:
-        super().__init__(config)
-        self.api_key = self.config["provider"]["api_key"]
-        self.model = self.config["provider"]["model"]
+    def feed(self, event: str) -> T.List[DELTA_t]:
+        j = json.loads(event)
+        if not j.get("choices"):
+            return []
+        delta = j["choices"][0].get("delta") or {}
 
-        self.HEADERS = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        deltas: T.List[DELTA_t] = []
+        if delta.get("content"):
+            self.content += delta["content"]
+            deltas.append(TextDeltaMsg("llm", delta["content"]))
 
-    def send(
-        self, messages: T.List[MSG_t], functions: T.List[FunctionType]
-    ) -> T.List[MSG_t]:
-        payload = {"model": self.model, "messages": [convert_msg(m) for m in messages]}
+        if delta.get("function_call"):
+            fn = delta["function_call"]
+            if self.fcall is None:
+                self.fcall = {"name": "", "arguments": ""}
+            self.fcall["name"] += fn.get("name") or ""
+            self.fcall["arguments"] += fn.get("arguments") or ""
+            deltas.append(FunctionCallDeltaMsg(0, self.fcall["name"], fn.get("arguments") or ""))
 
-        if functions:
-            payload["functions"] = [convert_function(f) for f in functions]
-            payload["function_call"] = "auto"
+        return deltas
 
-        if self.config.get("debug", False):
-            print("SENDING", payload)
+    def finish(self) -> T.List[MSG_t]:
+        if self.fcall:
+            return [FunctionCallMsg(self.fcall["name"], json.loads(self.fcall["arguments"] or "{}"))]
+        else:
+            return [TextMsg("llm", self.content)]
+
+
+class OpenAILLM(ChatCompletionsLLM):
+    ENDPOINT = "https://api.openai.com/v1/chat/completions"
+    FUNCTIONS = "functions"
+    FUNCTION_CHOICE = "function_call"
+    STREAM_PARSER = StreamParser
 
-        resp = requests.post(self.ENDPOINT, headers=self.HEADERS, json=payload)
+    convert_function = staticmethod(convert_function)
 
-        if resp.status_code != 200:
-            return [
-                ErorrMsg(f"Response status code: {resp.status_code} != 200", resp.text)
-            ]
-        j = resp.json()
+    def encode_msg(self, msg: MSG_t) -> bytes:
+        return wirefmt.encode(convert_msg(msg))
 
+    def _parse(self, j: T.Dict[str, T.Any]) -> T.List[MSG_t]:
         choice = j["choices"][0]["message"]
         fcall = choice.get("function_call")
         if fcall:
@@ -1,30 +1,20 @@
 import typing as T
 import json
 
-from bond.config import Config
 from bond.lib.llm.interface import (
-    LLM,
     MSG_t,
-    ROLE_t,
     TextMsg,
     FunctionResultMsg,
     FunctionType,
     FunctionCallMsg,
-    ErorrMsg,
+    DELTA_t,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
 )
 
-import requests
-
-
-def translate_role(role: ROLE_t):
-    if role == "system":
-        return "system"
-    elif role == "user":
-        return "user"
-    elif role == "llm":
-        return "assistant"
-    else:
-        raise RuntimeError(f"Unknown role: {role}")
+from bond.lib.llm import wire as wirefmt
+from bond.lib.llm.impl import chat_completions
+from bond.lib.llm.impl.chat_completions import ChatCompletionsLLM, translate_role
 
 
 def convert_msg(msg: MSG_t):
@@ -86,42 +76,61 @@ def convert_function(f: FunctionType):
     }
 
 
-class OpenAILLM(LLM):
-    ENDPOINT = ""
+class StreamParser(chat_completions.StreamParser):
+    def __init__(self) -> None:
+        self.content = ""
+        self.calls: T.Dict[int, T.Dict[str, str]] = {}
 
-    def __init__(self, config: Config) -> None:
-        super().__init__(config)
-        self.api_key = self.config["provider"]["api_key"]
-        self.model_name = self.config["provider"]["model"]
+    def feed(self, event: str) -> T.List[DELTA_t]:
+        j = json.loads(event)
+        if not j.get("choices"):
+            return []
+        delta = j["choices"][0].get("delta") or {}
 
-        self.HEADERS = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        deltas: T.List[DELTA_t] = []
+        if delta.get("content"):
+            self.content += delta["content"]
+            deltas.append(TextDeltaMsg("llm", delta["content"]))
 
-    def send(
-        self, messages: T.List[MSG_t], functions: T.List[FunctionType]
-    ) -> T.List[MSG_t]:
-        payload = {
-            "model": self.model_name,
-            # "reasoning_effort": "high",
-            "messages": [convert_msg(m) for m in messages],
-        }
+        for tc in delta.get("tool_calls") or []:
+            index = tc.get("index", 0)
+            fn = tc.get("function") or {}
+            call = self.calls.setdefault(index, {"name": "", "arguments": ""})
+            call["name"] += fn.get("name") or ""
+            call["arguments"] += fn.get("arguments") or ""
+            deltas.append(FunctionCallDeltaMsg(index, call["name"], fn.get("arguments") or ""))
+
+        return deltas
+
+    def finish(self) -> T.List[MSG_t]:
+        msgs: T.List[MSG_t] = []
+        if self.content:
+            msgs.append(TextMsg("llm", self.content))
+        for index in sorted(self.calls):
+            msgs.append(FunctionCallMsg(self.calls[index]["name"], json.loads(self.calls[index]["arguments"] or "{}")))
+        return msgs
+
+
+class OpenAILLM(ChatCompletionsLLM):
+    STREAM_PARSER = StreamParser
 
-        if functions:
-            payload["tools"] = [convert_function(f) for f in functions]
-            payload["tool_choice"] = "auto"
+    convert_function = staticmethod(convert_function)
 
-        resp = requests.post(self.ENDPOINT, headers=self.HEADERS, json=payload)
-        if resp.status_code != 200:
-            return [ErorrMsg(f"Response status code: {resp.status_code} != 200", resp.text)]
-        j = resp.json()
+    def encode_msg(self, msg: MSG_t) -> bytes:
+        return wirefmt.encode(convert_msg(msg))
 
+    def _parse(self, j: T.Dict[str, T.Any]) -> T.List[MSG_t]:
         finish_reason = j["choices"][0]["finish_reason"]
         choice = j["choices"][0]["message"]
-        if finish_reason == "tool_calls":
-            fcall = choice.get("tool_calls")[0]["function"]
-            return [FunctionCallMsg(fcall["name"], json.loads(fcall["arguments"]))]
+        if finish_reason == "tool_calls" or choice.get("tool_calls"):
+            # Same order as the stream parser, any text the model wrote
+            # before its calls comes first.
+            msgs: T.List[MSG_t] = []
+            if choice.get("content"):
+                msgs.append(TextMsg("llm", choice["content"]))
+            for x in choice.get("tool_calls") or []:
+                msgs.append(FunctionCallMsg(x["function"]["name"], json.loads(x["function"]["arguments"] or "{}")))
+            return msgs
         elif "content" not in choice:
             return []
         else:
@@ -0,0 +1,172 @@
+import typing as T
+import gzip
+import json
+import hashlib
+import pathlib
+
+from bond.config import Config
+from bond.lib.diskcache import DiskLRU
+from bond.lib.llm import wire as wirefmt
+from bond.lib.functions.registry import ToolRegistry
+from bond.lib.llm.interface import (
+    LLM,
+    MSG_t,
+    DELTA_t,
+    FunctionType,
+    ErorrMsg,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
+    dump_msg,
+    load_msg,
+)
+
+MODES = ("record", "replay", "replay_or_record")
+
+
+def canonical_function(f: FunctionType) -> T.Dict[str, T.Any]:
+    return {
+        "name": f.name,
+        "description": f.description,
+        "params": [
+            {"kind": type(p).__name__, "name": p.name, "type": p.type, "description": p.description}
+            for p in f.params
+        ],
+    }
+
+
+class ReplayCache(DiskLRU):
+    """Content-addressed response store, one gzipped JSON file per request.
+
+    Files live under `<path>/<key[:2]>/<key>.json.gz`, the least recently
+    read ones go once the store grows past `max_bytes`.
+    """
+
+    def __init__(self, path: pathlib.Path, max_bytes: int) -> None:
+        super().__init__(path, max_bytes, "*/*.json.gz")
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key: str) -> pathlib.Path:
+        return self.path / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str) -> T.Optional[T.List[MSG_t]]:
+        data = self._read(self._file(key))
+        if data is None:
+            self.misses += 1
+            return None
+        entry = json.loads(gzip.decompress(data))
+        self.hits += 1
+        return [load_msg(x) for x in entry["response"]]
+
+    def put(self, key: str, msgs: T.Sequence[MSG_t]) -> None:
+        self._write(self._file(key), gzip.compress(wirefmt.encode({"key": key, "response": [dump_msg(m) for m in msgs]})))
+
+
+class ReplayLLM(LLM):
+    """Record/replay cache in front of another LLM.
+
+    Config lives under the `[replay]` table:
+      mode ("record", "replay" or "replay_or_record"), path (".bond/replay"),
+      max_bytes (256 MiB).
+    Requests are keyed on the provider, model, encoded messages and function
+    schemas. Error responses are never recorded.
+    """
+
+    def __init__(self, config: Config, inner: LLM) -> None:
+        super().__init__(config)
+        self.inner = inner
+
+        conf = config.get("replay", {}) or {}
+        self.mode = conf.get("mode", "replay_or_record")
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown replay mode: {self.mode}. Must be one of {MODES}")
+        self.cache = ReplayCache(
+            pathlib.Path(conf.get("path", ".bond/replay")).expanduser(),
+            int(conf.get("max_bytes", 256 * 1024 * 1024)),
+        )
+
+    def info(self) -> str:
+        return self.inner.info()
+
+    def encode_msg(self, msg: MSG_t) -> bytes:
+        return self.inner.encode_msg(msg)
+
+    def key(self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]]) -> str:
+        if wire is None:
+            wire = [self.encode_msg(m) for m in messages]
+        provider = self.config.get("provider", {}) or {}
+
+        h = hashlib.sha256()
+        h.update(wirefmt.encode([provider.get("name"), provider.get("model")]))
+        h.update(wirefmt.array(wire))
+        if isinstance(functions, ToolRegistry):
+            # Converted once per registry, like the backends' tool schemas.
+            h.update(functions.encoded(canonical_function))
+        else:
+            h.update(wirefmt.array(wirefmt.encode(canonical_function(f)) for f in functions))
+        return h.hexdigest()
+
+    def _lookup(self, key: str) -> T.Optional[T.List[MSG_t]]:
+        if self.mode == "record":
+            return None
+        msgs = self.cache.get(key)
+        if msgs is None and self.mode == "replay":
+            return [ErorrMsg("Replay cache miss", key)]
+        return msgs
+
+    def _record(self, key: str, msgs: T.Sequence[MSG_t]) -> None:
+        if not any(isinstance(m, ErorrMsg) for m in msgs):
+            self.cache.put(key, msgs)
+
+    def send(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        key = self.key(messages, functions, wire)
+        msgs = self._lookup(key)
+        if msgs is None:
+            msgs = list(self.inner.send(messages, functions, wire))
+            self._record(key, msgs)
+        return msgs
+
+    def stream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.Iterator[T.Union[MSG_t, DELTA_t]]:
+        key = self.key(messages, functions, wire)
+        msgs = self._lookup(key)
+        if msgs is not None:
+            yield from msgs
+            return
+
+        msgs = []
+        for msg in self.inner.stream(messages, functions, wire):
+            if not isinstance(msg, (TextDeltaMsg, FunctionCallDeltaMsg)):
+                msgs.append(msg)
+            yield msg
+        self._record(key, msgs)
+
+    async def asend(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.List[MSG_t]:
+        key = self.key(messages, functions, wire)
+        msgs = self._lookup(key)
+        if msgs is None:
+            msgs = list(await self.inner.asend(messages, functions, wire))
+            self._record(key, msgs)
+        return msgs
+
+    async def astream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.AsyncIterator[T.Union[MSG_t, DELTA_t]]:
+        key = self.key(messages, functions, wire)
+        msgs = self._lookup(key)
+        if msgs is not None:
+            for msg in msgs:
+                yield msg
+            return
+
+        msgs = []
+        async for msg in self.inner.astream(messages, functions, wire):
+            if not isinstance(msg, (TextDeltaMsg, FunctionCallDeltaMsg)):
+                msgs.append(msg)
+            yield msg
+        self._record(key, msgs)
@@ -1,4 +1,7 @@
 import typing as T
+import asyncio
+import json
+import threading as thr
 from collections import namedtuple
 
 from bond.config import Config
@@ -42,6 +45,58 @@ class ErorrMsg:
 
 MSG_t = T.Union[TextMsg, ImageMsg, FunctionCallMsg, FunctionResultMsg, ErorrMsg]
 
+_MSG_TYPES: T.Dict[str, T.Type] = {
+    "text": TextMsg,
+    "image": ImageMsg,
+    "function_call": FunctionCallMsg,
+    "function_result": FunctionResultMsg,
+    "error": ErorrMsg,
+}
+
+
+def dump_msg(msg: MSG_t) -> T.Dict[str, T.Any]:
+    """JSON-serializable form of `msg`, the inverse of load_msg."""
+    for name, cls in _MSG_TYPES.items():
+        if type(msg) is cls:
+            d = dict(msg.__dict__)
+            if isinstance(msg, ErorrMsg):
+                d["ext"] = None if msg.ext is None else str(msg.ext)
+            d["type"] = name
+            return d
+    raise TypeError(f"Unknown message: {msg}")
+
+
+def load_msg(d: T.Dict[str, T.Any]) -> MSG_t:
+    d = dict(d)
+    cls = _MSG_TYPES[d.pop("type")]
+    return cls(**d)
+
+
+class TextDeltaMsg:
+    def __init__(self, role: ROLE_t, data: str) -> None:
+        self.role = role
+        self.data = data
+
+
+class FunctionCallDeltaMsg:
+    def __init__(self, index: int, name: str, arguments: str) -> None:
+        self.index = index
+        self.name = name
+        self.arguments = arguments
+
+
+class FunctionOutputDeltaMsg:
+    def __init__(self, name: str, stream: str, data: str) -> None:
+        self.name = name
+        self.stream = stream
+        self.data = data
+
+
+# Partial output of a streamed response or of a running function. Deltas are
+# only meant for display, the complete messages are always yielded after them
+# and those are what should end up in the chat history.
+DELTA_t = T.Union[TextDeltaMsg, FunctionCallDeltaMsg, FunctionOutputDeltaMsg]
+
 class FunctionParamLiteral:
     def __init__(self, name: str, type: T.Literal["string", "integer"], description: str) -> None:
         self.name = name
@@ -71,6 +126,9 @@ class FunctionType:
         self.params = params
 
 
+_END = object()
+
+
 class LLM:
     def __init__(self, config: Config) -> None:
         self.config = config
@@ -78,7 +136,73 @@ class LLM:
     def info(self) -> str:
         return ""
 
+    # Wire encoding of a single message. Chat caches the result per thread and
+    # hands it back through the `wire` argument, backends that build their
+    # payload from it only ever encode every message once.
+    def encode_msg(self, msg: MSG_t) -> bytes:
+        return json.dumps(msg.__dict__, default=str).encode()
+
     def send(
-        self, messages: T.List[MSG_t], functions: T.List[FunctionType]
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
     ) -> T.Sequence[MSG_t]:
         raise NotImplementedError()
+
+    def stream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.Iterator[T.Union[MSG_t, DELTA_t]]:
+        yield from self.send(messages, functions, wire)
+
+    # Backends without native asyncio support run the blocking call on the
+    # default executor, so they still work with the async agent. A cancelled
+    # asend only stops waiting, the request itself runs to completion.
+    async def asend(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.Sequence[MSG_t]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.send, list(messages), functions, wire)
+
+    # The blocking stream runs on the default executor and hands every item to
+    # the loop as it comes, so deltas still arrive one by one. Once the consumer
+    # stops (or is cancelled) the worker closes the stream, and with it the
+    # response, before its next item.
+    async def astream(
+        self, messages: T.List[MSG_t], functions: T.List[FunctionType], wire: T.Optional[T.List[bytes]] = None
+    ) -> T.AsyncIterator[T.Union[MSG_t, DELTA_t]]:
+        loop = asyncio.get_event_loop()
+        items: "asyncio.Queue[T.Tuple[T.Any, T.Optional[BaseException]]]" = asyncio.Queue()
+        stop = thr.Event()
+        messages = list(messages)
+
+        def put(item: T.Any, error: T.Optional[BaseException] = None) -> None:
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (item, error))
+            except RuntimeError:
+                # The loop is gone, nobody is listening anymore.
+                stop.set()
+
+        def relay() -> None:
+            error: T.Optional[BaseException] = None
+            it = self.stream(messages, functions, wire)
+            try:
+                for item in it:
+                    if stop.is_set():
+                        break
+                    put(item)
+            except Exception as e:
+                error = e
+            finally:
+                if hasattr(it, "close"):
+                    it.close()
+                put(_END, error)
+
+        loop.run_in_executor(None, relay)
+        try:
+            while True:
+                item, error = await items.get()
+                if item is _END:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            stop.set()
@@ -0,0 +1,233 @@
+import typing as T
+import re
+import time
+import random
+import asyncio
+import threading as thr
+import email.utils
+
+from bond.config import Config
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> T.Optional[float]:
+    """Parses `x-ratelimit-reset-*` values such as `20ms`, `1s` or `6m0s`."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def parse_retry_after(value: str) -> T.Optional[float]:
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, n: float, now: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        n = min(n, self.capacity)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < n:
+            wait = max(wait, (n - self.tokens) / self.rate)
+        return wait
+
+    def take(self, n: float) -> None:
+        if self.enabled:
+            self.tokens -= min(n, self.capacity)
+
+    def observe(self, limit: T.Optional[float], remaining: T.Optional[float], reset: T.Optional[float], now: float) -> None:
+        """Syncs the bucket with the server's view from the x-ratelimit headers."""
+        if limit and not self.enabled:
+            self.capacity = limit
+            self.rate = limit / 60.0
+            self.tokens = limit
+            self.updated = now
+        if remaining is None or not self.enabled:
+            return
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset:
+            self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class RateLimiter:
+    """Client side scheduler shared by every LLM talking to the same endpoint.
+
+    Config lives under the `[ratelimit]` table:
+      requests_per_minute (0 = learn from headers), tokens_per_minute (0 = learn
+      from headers), max_retries (5), base_delay (1), max_delay (60).
+    Requests wait in `acquire` until both buckets allow them, 429 and 5xx
+    responses are retried with exponential backoff and full jitter, never
+    sooner than the server's Retry-After.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, config: Config) -> None:
+        conf = config.get("ratelimit", {}) or {}
+        self.requests = TokenBucket(float(conf.get("requests_per_minute", 0)))
+        self.tokens = TokenBucket(float(conf.get("tokens_per_minute", 0)))
+        self.max_retries = int(conf.get("max_retries", 5))
+        self.base_delay = float(conf.get("base_delay", 1))
+        self.max_delay = float(conf.get("max_delay", 60))
+
+        self._mutex = thr.Lock()
+        self._blocked_until = 0.0
+
+        self.queue_depth = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def _reserve(self, tokens: float) -> float:
+        with self._mutex:
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self.requests.delay(1, now),
+                self.tokens.delay(tokens, now),
+            )
+            if wait <= 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            return wait
+
+    def _waited(self, t: float) -> float:
+        waited = time.monotonic() - t
+        with self._mutex:
+            self.queue_depth -= 1
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def acquire(self, tokens: float = 0) -> float:
+        """Blocks until a request of roughly `tokens` tokens may be sent, returns the time waited."""
+        t = time.monotonic()
+        with self._mutex:
+            self.queue_depth += 1
+        try:
+            while (wait := self._reserve(tokens)) > 0:
+                time.sleep(wait)
+        finally:
+            waited = self._waited(t)
+        return waited
+
+    async def aacquire(self, tokens: float = 0) -> float:
+        t = time.monotonic()
+        with self._mutex:
+            self.queue_depth += 1
+        try:
+            while (wait := self._reserve(tokens)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            waited = self._waited(t)
+        return waited
+
+    def _observe(self, headers: T.Mapping[str, str]) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            try:
+                bucket.observe(
+                    float(limit) if limit else None,
+                    float(remaining) if remaining else None,
+                    parse_duration(reset) if reset else None,
+                    now,
+                )
+            except ValueError:
+                pass
+
+    def retry_delay(self, attempt: int, status: int, headers: T.Mapping[str, str]) -> T.Optional[float]:
+        """Records a response, returns how long to wait before retrying it or None if it's final."""
+        with self._mutex:
+            self._observe(headers)
+            if status not in self.RETRY_STATUS or attempt >= self.max_retries:
+                return None
+
+            if status == 429:
+                self.throttled += 1
+            self.retries += 1
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            retry_after = headers.get("retry-after")
+            if retry_after:
+                delay = max(delay, parse_retry_after(retry_after) or 0.0)
+            if status == 429:
+                # Every request sharing the limiter backs off, not just this one.
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    def stats(self) -> T.Dict[str, T.Any]:
+        with self._mutex:
+            return {
+                "queue_depth": self.queue_depth,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "max_wait": self.max_wait,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+
+_limiters: T.Dict[str, RateLimiter] = {}
+_limiters_mutex = thr.Lock()
+
+
+def get_limiter(config: Config, key: str) -> RateLimiter:
+    """Returns the process wide limiter for `key` (usually endpoint + api key)."""
+    with _limiters_mutex:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(config)
+        return _limiters[key]
+
+
+def limiter_stats() -> T.Dict[str, T.Dict[str, T.Any]]:
+    """Stats of every limiter, by endpoint (the api key in the limiter's key is left out)."""
+    with _limiters_mutex:
+        limiters = list(_limiters.items())
+    out: T.Dict[str, T.Dict[str, T.Any]] = {}
+    for key, limiter in limiters:
+        name = key.split("|", 1)[0] or "default"
+        if name in out:
+            name = f"{name} #{len(out)}"
+        out[name] = limiter.stats()
+    return out
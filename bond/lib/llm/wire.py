@@ -0,0 +1,19 @@
+import typing as T
+import json
+
+
+def encode(obj: T.Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def array(items: T.Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def obj(fields: T.Iterable[T.Tuple[str, bytes]]) -> bytes:
+    """Assembles a JSON object from already encoded values.
+
+    Lets callers splice cached fragments (messages, tool schemas) into a
+    payload without decoding and re-encoding them on every request.
+    """
+    return b"{" + b",".join(encode(k) + b":" + v for k, v in fields) + b"}"
@@ -0,0 +1,132 @@
+import typing as T
+import os
+import json
+import time
+import atexit
+import asyncio
+import pathlib
+import contextlib
+import threading as thr
+from collections import deque
+
+from bond.config import Config
+
+_NOOP = contextlib.nullcontext()
+
+
+def _lane() -> int:
+    # Concurrent asyncio tasks share a thread, give each its own track.
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else thr.get_ident()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "lane", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: T.Dict[str, T.Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.lane = _lane()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        end = time.perf_counter_ns()
+        self.tracer.spans.append((self.name, self.start, end - self.start, self.lane, self.args))
+
+
+class Tracer:
+    """Keeps the last `size` spans in a ring buffer.
+
+    Spans are (name, start ns, duration ns, lane, args) tuples, appending to
+    the deque is thread safe and cheap enough to leave on.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.spans: "deque[T.Tuple[str, int, int, int, T.Dict[str, T.Any]]]" = deque(maxlen=size)
+
+    def span(self, name: str, args: T.Dict[str, T.Any]) -> _Span:
+        return _Span(self, name, args)
+
+    def chrome_trace(self) -> T.Dict[str, T.Any]:
+        """The buffer in Chrome trace-event format, for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        lanes: T.Dict[int, int] = {}
+        events = []
+        for name, start, dur, lane, args in list(self.spans):
+            tid = lanes.setdefault(lane, len(lanes) + 1)
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": dur / 1000,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self) -> T.Dict[str, T.Dict[str, float]]:
+        """Count, total, p50 and p95 in milliseconds per span name."""
+        durations: T.Dict[str, T.List[float]] = {}
+        for name, _, dur, _, _ in list(self.spans):
+            durations.setdefault(name, []).append(dur / 1e6)
+
+        out = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            out[name] = {
+                "count": len(values),
+                "total": sum(values),
+                "p50": values[int(0.50 * (len(values) - 1))],
+                "p95": values[int(0.95 * (len(values) - 1))],
+            }
+        return out
+
+    def export(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        with open(path.with_name(f"{path.stem}.summary.json"), "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+_tracer: T.Optional[Tracer] = None
+
+
+def configure(config: Config) -> T.Optional[Tracer]:
+    """Turns tracing on if the `[trace]` table says so.
+
+    Config: enabled (false), buffer (100000 spans), path (".bond/trace.json",
+    written at exit together with a `.summary.json` next to it, "" to skip).
+    """
+    global _tracer
+    conf = config.get("trace", {}) or {}
+    if not conf.get("enabled", False) or _tracer is not None:
+        return _tracer
+
+    _tracer = Tracer(int(conf.get("buffer", 100000)))
+    path = conf.get("path", ".bond/trace.json")
+    if path:
+        atexit.register(_tracer.export, pathlib.Path(path).expanduser())
+    return _tracer
+
+
+def tracer() -> T.Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, **args: T.Any) -> T.ContextManager[T.Any]:
+    """Times the enclosed block as `name`, a shared no-op when tracing is off."""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.span(name, args)
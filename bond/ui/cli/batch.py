@@ -0,0 +1,161 @@
+import sys
+import json
+import time
+import typing as T
+import asyncio
+import argparse
+import contextvars
+
+from bond.config import Config
+from bond.lib.agent.main import AsyncAgent
+from bond.lib.llm.factory import make_llm
+from bond.lib.llm import ratelimit
+from bond.lib.llm.impl.hedged import HedgedLLM
+from bond.lib.llm.interface import (
+    MSG_t,
+    DELTA_t,
+    TextMsg,
+    FunctionCallMsg,
+    ErorrMsg,
+    dump_msg,
+)
+
+# Every task runs in its own asyncio task, this tells the shared callback
+# which one a message belongs to.
+_current: "contextvars.ContextVar[T.Optional[T.Dict[str, T.Any]]]" = contextvars.ContextVar("batch_task", default=None)
+
+
+def read_tasks(lines: T.Iterable[str]) -> T.Iterator[T.Dict[str, T.Any]]:
+    """Parses JSONL tasks, either {"id": ..., "prompt": ...} objects or bare strings."""
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        task = json.loads(line)
+        if isinstance(task, str):
+            task = {"prompt": task}
+        if "prompt" not in task:
+            raise ValueError(f"Line {n}: task has no prompt")
+        task.setdefault("id", n)
+        yield task
+
+
+class Batch:
+    """Runs tasks concurrently on one AsyncAgent, each in its own thread.
+
+    All tasks share the agent's LLM (so its connection pool and rate limiter)
+    and tool executor. Config lives under the `[batch]` table:
+      concurrency (8).
+    """
+
+    def __init__(self, conf: Config, concurrency: T.Optional[int] = None, messages: bool = False) -> None:
+        self.conf = conf
+        self.concurrency = concurrency or int((conf.get("batch", {}) or {}).get("concurrency", 8))
+        self.messages = messages
+        self.agent = AsyncAgent(conf, make_llm(conf), self.handle_msg)
+
+        self.done = 0
+        self.failed = 0
+
+    def handle_msg(self, msg: T.Union[MSG_t, DELTA_t]):
+        state = _current.get()
+        if state is None:
+            return
+        if isinstance(msg, ErorrMsg):
+            state["errors"].append(msg.data)
+        elif isinstance(msg, FunctionCallMsg):
+            state["tool_calls"] += 1
+
+    async def run_task(self, task: T.Dict[str, T.Any], queued: float) -> T.Dict[str, T.Any]:
+        state: T.Dict[str, T.Any] = {"errors": [], "tool_calls": 0}
+        _current.set(state)
+
+        thread = self.agent.new_thread()
+        start = time.monotonic()
+        try:
+            await self.agent.run(thread, [TextMsg("user", task["prompt"])])
+        except Exception as e:
+            state["errors"].append(f"{e.__class__.__name__} - {e}")
+        duration = time.monotonic() - start
+
+        msgs = self.agent.chat.messages(thread)
+        output = next((m.data for m in reversed(msgs) if isinstance(m, TextMsg) and m.role == "llm"), None)
+        result = {
+            "id": task["id"],
+            "status": "error" if state["errors"] else "ok",
+            "output": output,
+            "errors": state["errors"],
+            "tool_calls": state["tool_calls"],
+            "queued": start - queued,
+            "duration": duration,
+        }
+        if self.messages:
+            result["messages"] = [dump_msg(m) for m in msgs]
+
+        self.agent.chat.drop_thread(thread)
+        return result
+
+    def stats(self) -> T.Dict[str, T.Dict[str, T.Any]]:
+        """Counters for the end of run summary, one line each."""
+        stats = {f"ratelimit {name}": s for name, s in ratelimit.limiter_stats().items()}
+        if self.agent.executor.cache.enabled:
+            stats["tool cache"] = self.agent.executor.cache.stats()
+        llm = getattr(self.agent.chat.llm, "inner", self.agent.chat.llm)
+        if isinstance(llm, HedgedLLM):
+            stats.update((f"hedge {name}", h) for name, h in llm.stats().items())
+        return stats
+
+    async def run(self, tasks: T.Iterable[T.Dict[str, T.Any]], out: T.TextIO) -> None:
+        started = time.monotonic()
+        it = iter(tasks)
+
+        async def worker():
+            for task in it:
+                result = await self.run_task(task, started)
+                self.done += 1
+                if result["status"] != "ok":
+                    self.failed += 1
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+
+
+def _fmt(v: T.Any) -> str:
+    return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Runs prompts from a JSONL file through the agent without a UI.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL tasks, `-` for stdin.")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results, `-` for stdout.")
+    parser.add_argument("-c", "--concurrency", type=int, help="Tasks in flight, defaults to [batch] concurrency.")
+    parser.add_argument("--config", default=".bond/conf.toml")
+    parser.add_argument("--messages", action="store_true", help="Include every task's messages in its result.")
+    args = parser.parse_args()
+
+    conf = Config.load(args.config)
+
+    inp = sys.stdin if args.input == "-" else open(args.input)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        batch = Batch(conf, args.concurrency, args.messages)
+        start = time.monotonic()
+        asyncio.run(batch.run(read_tasks(inp), out))
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"{batch.done} tasks, {batch.failed} failed, {time.monotonic() - start:.2f}s",
+        file=sys.stderr,
+    )
+    for name, stats in batch.stats().items():
+        print(f"{name}: " + ", ".join(f"{k}={_fmt(v)}" for k, v in stats.items()), file=sys.stderr)
+    sys.exit(1 if batch.failed else 0)
+
+
+if __name__ == "__main__":
+    run()
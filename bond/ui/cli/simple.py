@@ -1,4 +1,8 @@
 import time
+import uuid
+import argparse
+import datetime
+import typing as T
 from io import StringIO
 
 from prompt_toolkit import PromptSession
@@ -12,30 +16,61 @@ from rich.console import Console
 
 from bond.config import Config
 from bond.lib.agent.main import Agent
+from bond.lib.agent.store import SessionStore
+from bond.lib.llm.factory import make_llm
+from bond.lib.trace import span
 from bond.lib.llm.interface import (
     MSG_t,
+    DELTA_t,
     TextMsg,
+    TextDeltaMsg,
+    FunctionCallDeltaMsg,
+    FunctionOutputDeltaMsg,
     FunctionCallMsg,
     FunctionResultMsg,
     ErorrMsg,
 )
 
 
-class Simple:
-    def __init__(self, conf: Config) -> None:
-        self.conf = conf
+def _flush_point(text: str) -> int:
+    """Returns the end of the last complete Markdown block in `text`.
 
-        if self.conf["provider"]["name"] == "gemini":
-            from bond.lib.llm.impl.gemini_oai import GeminiLLM
+    A block ends on a blank line that is not inside a fenced code block, which
+    is the finest granularity at which rendering can't change retroactively.
+    """
+    point = 0
+    pos = 0
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if not line.endswith("\n"):
+            break
+        pos += len(line)
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and line.strip() == "":
+            point = pos
+    return point
 
-            self.agent = Agent(conf, GeminiLLM(conf), self.handle_msg)
-        elif self.conf["provider"]["name"] == "openai":
-            from bond.lib.llm.impl.openai import OpenAILLM
 
-            self.agent = Agent(conf, OpenAILLM(conf), self.handle_msg)
+class Simple:
+    def __init__(self, conf: Config, store: T.Optional[SessionStore] = None, session: T.Optional[str] = None) -> None:
+        self.conf = conf
+        self.store = store
+        self._stream_buf = ""
+        self._stream_done = 0
+        # Unfinished last line of running function output.
+        self._output_buf = ""
+
+        self.agent = Agent(conf, make_llm(conf), self.handle_msg, store, session)
+        if session is not None:
+            for msg in self.agent.chat.messages(self.agent.session):
+                if isinstance(msg, TextMsg) and msg.role == "user" and msg.data:
+                    print_formatted_text(f"> {msg.data}")
+                elif not (isinstance(msg, TextMsg) and msg.role == "system"):
+                    self.handle_msg(msg)
 
         kb = KeyBindings()
-        kb.add("c-c")(lambda event: self.agent.cancel.set())
+        kb.add("c-c")(lambda event: self.agent.cancel())
         kb.add("c-d")(lambda event: event.app.exit(exception=KeyboardInterrupt))
         kb.add("escape", "enter")(lambda event: event.current_buffer.insert_text("\n"))
 
@@ -47,23 +82,48 @@ class Simple:
         )
 
 
-    def handle_msg(self, msg: MSG_t):
-        if isinstance(msg, TextMsg):
+    def render_markdown(self, data: str):
+        console = Console(
+            file=StringIO(),
+            highlight=True,
+            force_terminal=True,
+            color_system="truecolor",
+        )
+        console.print(Markdown(data))
+        txt = to_formatted_text(ANSI(console.file.getvalue()))
+        print_formatted_text(txt)
+
+    def handle_msg(self, msg: T.Union[MSG_t, DELTA_t]):
+        with span("ui.render", type=type(msg).__name__):
+            self._handle_msg(msg)
+
+    def _handle_msg(self, msg: T.Union[MSG_t, DELTA_t]):
+        if isinstance(msg, TextDeltaMsg):
+            self._stream_buf += msg.data
+            pending = self._stream_buf[self._stream_done :]
+            point = _flush_point(pending)
+            if point and pending[:point].strip():
+                self.render_markdown(pending[:point])
+            self._stream_done += point
+        elif isinstance(msg, FunctionCallDeltaMsg):
+            pass
+        elif isinstance(msg, FunctionOutputDeltaMsg):
+            *lines, self._output_buf = (self._output_buf + msg.data).split("\n")
+            for line in lines:
+                print_formatted_text(to_formatted_text(ANSI(f"\033[2m│ {line}\033[0m")))
+        elif isinstance(msg, TextMsg):
             if msg.role == "system":
                 print_formatted_text(f"S {msg.data}")
             elif msg.role == "llm":
-                console = Console(
-                    file=StringIO(),
-                    highlight=True,
-                    force_terminal=True,
-                    color_system="truecolor",
-                )
-                console.print(Markdown(msg.data))
-                txt = to_formatted_text(ANSI(console.file.getvalue()))
-                print_formatted_text(txt)
+                rest = msg.data[self._stream_done :] if self._stream_buf else msg.data
+                self._stream_buf = ""
+                self._stream_done = 0
+                if rest.strip():
+                    self.render_markdown(rest)
             elif msg.role == "user":
                 # print_formatted_text(f"> {msg.data}")
-                pass
+                self._stream_buf = ""
+                self._stream_done = 0
         elif isinstance(msg, FunctionCallMsg):
             R = "\033[0m"
             G = "\033[32m"  # Green
@@ -88,6 +148,9 @@ class Simple:
             )
 
         elif isinstance(msg, FunctionResultMsg):
+            if self._output_buf:
+                print_formatted_text(to_formatted_text(ANSI(f"\033[2m│ {self._output_buf}\033[0m")))
+                self._output_buf = ""
             R = "\033[0m"
             G = "\033[32m"
             Y = "\033[33m"
@@ -112,7 +175,7 @@ class Simple:
         s = ""
         s += f"{self.conf['provider']['name']:<10} | "
         s += f"{self.conf['provider']['model']:<10} | "
-        s += f"{'WORKING' if self.agent.busy else 'READY':<10}"
+        s += f"{self.agent.state.value:<10}"
         s += " |==| "
         s += "Enter: Send | "
         s += "C-c: Stop | "
@@ -128,11 +191,52 @@ class Simple:
                 # print("\033[F\033[K", end='')
                 self.agent.send_txt(txt)
         except KeyboardInterrupt:
+            if self.store is not None:
+                self.store.close()
+                print(f"Session {self.agent.session}")
             print("Bye")
             return
 
 
+def list_sessions(store: SessionStore):
+    for meta in store.sessions():
+        updated = datetime.datetime.fromtimestamp(meta["updated"]).strftime("%Y-%m-%d %H:%M")
+        print(f"{meta['id']}  {updated}  {meta['count']:>5}  {meta['title']}")
+
+
 def run():
+    parser = argparse.ArgumentParser(description="Interactive agent.")
+    parser.add_argument("-l", "--list", action="store_true", help="List stored sessions and exit.")
+    parser.add_argument("-r", "--resume", metavar="ID", help="Continue a stored session.")
+    parser.add_argument("-c", "--continue", dest="last", action="store_true", help="Continue the last session.")
+    parser.add_argument("--fork", metavar="ID", help="Start a new session from a copy of a stored one.")
+    args = parser.parse_args()
+
     conf = Config.load(".bond/conf.toml")
 
-    Simple(conf).loop()
+    store = None
+    if (conf.get("sessions", {}) or {}).get("enabled", True):
+        store = SessionStore(conf)
+    elif args.list or args.resume or args.last or args.fork:
+        parser.error("sessions are disabled in the config")
+
+    session = None
+    if store is not None:
+        if args.list:
+            list_sessions(store)
+            return
+        if args.last:
+            sessions = store.sessions()
+            if not sessions:
+                parser.error("no stored sessions")
+            session = sessions[0]["id"]
+        for sid in (args.resume, args.fork):
+            if sid is not None and not store.exists(sid):
+                parser.error(f"unknown session: {sid}")
+        if args.resume:
+            session = args.resume
+        if args.fork:
+            session = uuid.uuid4().hex[:8]
+            store.fork(args.fork, session)
+
+    Simple(conf, store, session).loop()
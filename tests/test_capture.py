@@ -0,0 +1,76 @@
+import random
+
+from bond.lib.functions import capture
+from bond.lib.functions.capture import Capture
+
+
+def _feed(c: Capture, data: bytes, sizes) -> None:
+    i = 0
+    while i < len(data):
+        n = next(sizes)
+        c.write(data[i : i + n])
+        i += n
+
+
+def test_keeps_head_and_tail():
+    c = Capture(head=4, tail=4)
+    c.write(b"abcdefghij")
+    assert bytes(c.head) == b"abcd"
+    assert c.tail() == b"ghij"
+    assert c.dropped == 2
+    assert c.text() == "abcd\n... [2 bytes dropped] ...\nghij"
+
+
+def test_short_output_is_kept_whole():
+    c = Capture(head=4, tail=4)
+    c.write(b"abc")
+    c.write(b"def")
+    assert c.dropped == 0
+    assert c.text() == "abcdef"
+
+
+def test_chunking_does_not_matter():
+    rng = random.Random(0)
+    data = bytes(rng.randrange(256) for _ in range(5000))
+    whole = Capture(head=100, tail=333)
+    whole.write(data)
+    for _ in range(20):
+        c = Capture(head=100, tail=333)
+        _feed(c, data, iter(lambda: rng.randrange(1, 700), None))
+        assert (bytes(c.head), c.tail(), c.dropped, c.total) == (bytes(whole.head), whole.tail(), whole.dropped, 5000)
+
+
+def test_multibyte_character_across_head_and_tail():
+    c = Capture(head=2, tail=8)
+    c.write("aé".encode()[:2])
+    c.write("aé".encode()[2:] + b"b")
+    assert c.dropped == 0
+    assert c.text() == "aéb"
+
+
+def test_callback_gets_whole_characters():
+    got = []
+    c = Capture(got.append, head=1, tail=1)
+    data = "héllo wörld".encode()
+    for i in range(len(data)):
+        c.write(data[i : i + 1])
+    assert "".join(got) == "héllo wörld"
+
+
+def test_forwarder_and_result():
+    seen = []
+    token = capture.on_output.set(lambda name, stream, text: seen.append((name, stream, text)))
+    try:
+        out = Capture(capture.forwarder("proc", "stdout"), head=4, tail=4)
+        err = Capture(capture.forwarder("proc", "stderr"))
+    finally:
+        capture.on_output.reset(token)
+    out.write(b"0123456789")
+    err.write(b"warn\n")
+    assert seen == [("proc", "stdout", "0123456789"), ("proc", "stderr", "warn\n")]
+
+    r = capture.result(1, out, err, note="timed out")
+    assert not r["success"]
+    assert r["dropped"] == 2
+    assert r["error"] == "warn\ntimed out"
+    assert capture.forwarder("proc", "stdout") is None
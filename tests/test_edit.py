@@ -0,0 +1,61 @@
+import os
+import codecs
+
+from bond.lib.functions.impl.edit import edit, edit_hunks
+
+
+def test_keeps_indentation_and_crlf(tmp_path):
+    f = tmp_path / "a.py"
+    f.write_bytes(b"def f():\r\n    return 1\r\n\r\n")
+    r = edit(str(f), 1, 2, "    x = 2\n    return x")
+    assert r["success"], r
+    assert f.read_bytes() == b"def f():\r\n    x = 2\r\n    return x\r\n\r\n"
+    assert r["lines"] == 4
+
+
+def test_keeps_bom_and_latin1(tmp_path):
+    f = tmp_path / "bom.txt"
+    f.write_bytes(codecs.BOM_UTF8 + "a\nb\n".encode())
+    assert edit(str(f), 1, 1, "ü")["success"]
+    assert f.read_bytes() == codecs.BOM_UTF8 + "a\nü\nb\n".encode()
+
+    f = tmp_path / "latin.txt"
+    f.write_bytes("café\n".encode("latin-1"))
+    assert edit(str(f), 1, 1, "thé")["success"]
+    assert f.read_bytes() == "café\nthé\n".encode("latin-1")
+
+
+def test_append_without_final_newline(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a\nb")
+    assert edit(str(f), 2, 2, "c")["success"]
+    assert f.read_text() == "a\nb\nc"
+
+
+def test_hunks_use_original_line_numbers(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("".join(f"{i}\n" for i in range(6)))
+    r = edit_hunks(str(f), [4, 1], [5, 2], ["four\nfour", ""])
+    assert r["success"], r
+    assert f.read_text() == "0\n2\n3\nfour\nfour\n5\n"
+
+
+def test_failures_leave_the_file_untouched(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a\nb\nc\n")
+    st = os.stat(f)
+
+    r = edit_hunks(str(f), [0, 1], [2, 3], ["x", "y"])
+    assert not r["success"] and "overlap" in r["error"]
+    r = edit(str(f), 1, 9, "x")
+    assert not r["success"] and "Invalid end_line" in r["error"]
+
+    assert f.read_text() == "a\nb\nc\n"
+    assert os.stat(f).st_ino == st.st_ino
+    assert os.listdir(tmp_path) == ["a.txt"]
+
+
+def test_creates_missing_file(tmp_path):
+    f = tmp_path / "new.txt"
+    assert edit(str(f), 0, 0, "hello")["success"]
+    assert f.read_text() == "hello\n"
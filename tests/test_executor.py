@@ -0,0 +1,49 @@
+import time
+import asyncio
+import threading as thr
+
+from bond.config import Config
+from bond.lib.functions.executor import ToolExecutor
+from bond.lib.functions.interface import Function
+from bond.lib.llm.interface import FunctionCallMsg, FunctionType
+
+_mutex = thr.Lock()
+_active = {"now": 0, "max": 0}
+
+
+def _write(path: str) -> dict:
+    with _mutex:
+        _active["now"] += 1
+        _active["max"] = max(_active["max"], _active["now"])
+    time.sleep(0.05)
+    with _mutex:
+        _active["now"] -= 1
+    return {"success": True, "output": path, "error": ""}
+
+
+class WriteA(Function):
+    FUNCTION_t = FunctionType("write_a", "", [FunctionType.ParamLiteral("path", "string", "")])
+    CALLABLE = _write
+    WRITES = lambda path, **_: [path]
+
+
+class WriteB(WriteA):
+    FUNCTION_t = FunctionType("write_b", "", [FunctionType.ParamLiteral("path", "string", "")])
+
+
+def _run(paths):
+    _active.update(now=0, max=0)
+    functions = {"write_a": WriteA, "write_b": WriteB}
+    calls = [FunctionCallMsg("write_a" if i % 2 else "write_b", {"path": p}) for i, p in enumerate(paths)]
+    results = asyncio.run(ToolExecutor(Config({})).arun(calls, functions))
+    assert all(r.error is None for r in results)
+    return _active["max"]
+
+
+def test_writes_to_one_path_are_serialised(tmp_path):
+    p = str(tmp_path / "a.txt")
+    assert _run([p, p, str(tmp_path / "." / "a.txt")]) == 1
+
+
+def test_writes_to_different_paths_run_concurrently(tmp_path):
+    assert _run([str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]) == 2
@@ -0,0 +1,132 @@
+import time
+import asyncio
+import threading
+
+from bond.config import Config
+from bond.lib.llm.interface import LLM, TextMsg, TextDeltaMsg
+from bond.lib.llm.impl.hedged import HedgedLLM, LatencyHistogram
+
+
+class Slow(LLM):
+    def __init__(self, text: str, delay: float) -> None:
+        super().__init__(Config({}))
+        self.text = text
+        self.delay = delay
+
+    def send(self, messages, functions, wire=None):
+        time.sleep(self.delay)
+        return [TextMsg("llm", self.text)]
+
+    def stream(self, messages, functions, wire=None):
+        time.sleep(self.delay)
+        yield TextMsg("llm", self.text)
+
+    async def asend(self, messages, functions, wire=None):
+        await asyncio.sleep(self.delay)
+        return [TextMsg("llm", self.text)]
+
+    async def astream(self, messages, functions, wire=None):
+        await asyncio.sleep(self.delay)
+        yield TextMsg("llm", self.text)
+
+
+def _hedged(primary_delay: float = 0.5, secondary_delay: float = 0.0) -> HedgedLLM:
+    config = Config({"hedge": {"delay": 0.05, "min_samples": 1000}})
+    return HedgedLLM(config, [("a", Slow("a", primary_delay)), ("b", Slow("b", secondary_delay))])
+
+
+def _texts(msgs):
+    return [m.data for m in msgs if isinstance(m, TextMsg)]
+
+
+def test_histogram_percentile():
+    h = LatencyHistogram()
+    for ms in range(1, 101):
+        h.observe(ms / 1000)
+    assert h.count == 100
+    assert 0.045 <= h.percentile(50) <= 0.055
+    assert 0.090 <= h.percentile(95) <= 0.105
+
+
+def test_send_records_the_losing_primary():
+    llm = _hedged()
+    for _ in range(4):
+        assert _texts(llm.send([], [])) == ["b"]
+    assert llm.histograms["b"].count == 4
+    assert llm.histograms["a"].count == 4
+    # Lower bound samples, at least the hedge delay.
+    assert llm.histograms["a"].percentile(50) >= 0.045
+
+
+def test_stream_records_the_losing_primary():
+    llm = _hedged()
+    for _ in range(3):
+        assert _texts(llm.stream([], [])) == ["b"]
+    assert llm.histograms["a"].count == 3
+    assert llm.histograms["b"].count == 3
+
+
+def test_asend_records_the_losing_primary():
+    llm = _hedged()
+
+    async def main():
+        for _ in range(3):
+            assert _texts(await llm.asend([], [])) == ["b"]
+
+    asyncio.run(main())
+    assert llm.histograms["a"].count == 3
+    assert llm.histograms["b"].count == 3
+
+
+def test_astream_records_the_losing_primary():
+    llm = _hedged()
+
+    async def main():
+        for _ in range(3):
+            assert _texts([m async for m in llm.astream([], [])]) == ["b"]
+
+    asyncio.run(main())
+    assert llm.histograms["a"].count == 3
+    assert llm.histograms["b"].count == 3
+
+
+def test_fast_primary_is_not_hedged():
+    llm = _hedged(primary_delay=0.0, secondary_delay=0.0)
+    assert _texts(llm.send([], [])) == ["a"]
+    assert llm.histograms["a"].count == 1
+    assert llm.histograms["b"].count == 0
+
+
+
+class Late(LLM):
+    """Starts answering after `delay`, then never finishes on its own."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(Config({}))
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def stream(self, messages, functions, wire=None):
+        try:
+            time.sleep(self.delay)
+            while True:
+                yield TextDeltaMsg("llm", ".")
+                time.sleep(0.005)
+        finally:
+            self.closed.set()
+
+
+def test_send_stops_the_losing_primary():
+    primary = Late(0.1)
+    config = Config({"hedge": {"delay": 0.05, "min_samples": 1000}})
+    llm = HedgedLLM(config, [("a", primary), ("b", Slow("b", 0.0))])
+    assert _texts(llm.send([], [])) == ["b"]
+    # Stopped at its first chunk instead of holding a pool thread forever.
+    assert primary.closed.wait(1)
+
+
+def test_no_hedge_without_a_free_thread():
+    config = Config({"hedge": {"delay": 0.05, "min_samples": 1000, "max_inflight": 1}})
+    llm = HedgedLLM(config, [("a", Slow("a", 0.2)), ("b", Slow("b", 0.0))])
+    assert _texts(llm.send([], [])) == ["a"]
+    assert llm.histograms["b"].count == 0
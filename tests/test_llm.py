@@ -0,0 +1,137 @@
+import sys
+import time
+import asyncio
+
+from bond.config import Config
+from bond.bench.stub_server import StubServer
+from bond.lib.llm.interface import LLM, TextMsg, TextDeltaMsg
+from bond.lib.llm.impl.openai_old import OpenAILLM
+
+
+def test_astream_without_httpx_still_streams(monkeypatch):
+    monkeypatch.setitem(sys.modules, "httpx", None)
+    server = StubServer([{"text": "x" * 100}], chunk_chars=10).start()
+    try:
+        llm = OpenAILLM(Config({"provider": {"api_key": "k", "model": "m", "endpoint": server.url}}))
+
+        async def main():
+            return [m async for m in llm.astream([TextMsg("user", "hi")], [])]
+
+        msgs = asyncio.run(main())
+    finally:
+        server.stop()
+    assert llm.ahttp() is None
+    assert len([m for m in msgs if isinstance(m, TextDeltaMsg)]) == 10
+    assert isinstance(msgs[-1], TextMsg) and msgs[-1].data == "x" * 100
+
+
+class Ticker(LLM):
+    def __init__(self) -> None:
+        super().__init__(Config({}))
+        self.produced = 0
+        self.closed = False
+
+    def stream(self, messages, functions, wire=None):
+        try:
+            for i in range(100):
+                time.sleep(0.01)
+                self.produced += 1
+                yield TextDeltaMsg("llm", str(i))
+        finally:
+            self.closed = True
+
+    def send(self, messages, functions, wire=None):
+        return []
+
+
+def test_cancelled_astream_closes_the_blocking_stream():
+    llm = Ticker()
+
+    async def consume(first: asyncio.Event):
+        async for _ in llm.astream([], []):
+            first.set()
+
+    async def main():
+        first = asyncio.Event()
+        task = asyncio.ensure_future(consume(first))
+        await asyncio.wait_for(first.wait(), 5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert llm.closed
+    assert llm.produced < 20
+
+
+def test_astream_passes_errors_on():
+    class Broken(Ticker):
+        def stream(self, messages, functions, wire=None):
+            yield TextDeltaMsg("llm", "a")
+            raise ValueError("boom")
+
+    async def main():
+        got = []
+        try:
+            async for m in Broken().astream([], []):
+                got.append(m)
+        except ValueError as e:
+            return got, e
+
+    got, e = asyncio.run(main())
+    assert len(got) == 1 and str(e) == "boom"
+
+
+def _stub_llm(server) -> OpenAILLM:
+    return OpenAILLM(Config({"provider": {"api_key": "k", "model": "m", "endpoint": server.url}}))
+
+
+def test_asend_without_httpx_matches_send(monkeypatch):
+    monkeypatch.setitem(sys.modules, "httpx", None)
+    script = [{"tool_calls": [{"name": "view", "arguments": {"path": "a", "offset": 0}}]}, {"text": "done"}]
+    server = StubServer(script, chunk_chars=4).start()
+    try:
+        llm = _stub_llm(server)
+        sent = llm.send([TextMsg("user", "hi")], [])
+        asent = asyncio.run(llm.asend([TextMsg("user", "hi")], []))
+    finally:
+        server.stop()
+    assert [(type(m), m.__dict__) for m in asent] == [(type(m), m.__dict__) for m in sent]
+
+
+def test_cancelled_asend_without_httpx_closes_the_request(monkeypatch):
+    monkeypatch.setitem(sys.modules, "httpx", None)
+    server = StubServer([{"text": "x" * 100}], chunk_chars=1, chunk_latency=0.05).start()
+    try:
+        llm = _stub_llm(server)
+        stream = llm.stream
+        closed = []
+
+        def spy(*args):
+            try:
+                yield from stream(*args)
+            finally:
+                closed.append(time.monotonic())
+
+        monkeypatch.setattr(llm, "stream", spy)
+
+        async def main():
+            task = asyncio.ensure_future(llm.asend([TextMsg("user", "hi")], []))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            cancelled = time.monotonic()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await asyncio.sleep(0.3)
+            return cancelled
+
+        cancelled = asyncio.run(main())
+    finally:
+        server.stop()
+    # The whole answer would take 5s.
+    assert closed and closed[0] - cancelled < 0.3
@@ -0,0 +1,45 @@
+import json
+
+from bond.config import Config
+from bond.lib.llm.interface import TextMsg, FunctionCallMsg
+from bond.lib.llm.impl.openai_old import OpenAILLM, StreamParser
+
+
+def _llm() -> OpenAILLM:
+    return OpenAILLM(Config({"provider": {"api_key": "k", "model": "m", "endpoint": "http://127.0.0.1:9/"}}))
+
+
+def _call(name, args):
+    return {"type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+def test_result_keeps_content_before_tool_calls():
+    j = {
+        "choices": [
+            {
+                "finish_reason": "tool_calls",
+                "message": {"content": "Looking.", "tool_calls": [_call("view", {"path": "a"}), _call("view", {"path": "b"})]},
+            }
+        ]
+    }
+    msgs = _llm()._parse(j)
+    assert isinstance(msgs[0], TextMsg) and msgs[0].data == "Looking."
+    assert [m.params["path"] for m in msgs[1:] if isinstance(m, FunctionCallMsg)] == ["a", "b"]
+
+
+def test_result_matches_stream_parser():
+    content, calls = "Looking.", [_call("view", {"path": "a"})]
+    parser = StreamParser()
+    parser.feed(json.dumps({"choices": [{"delta": {"content": content}}]}))
+    parser.feed(json.dumps({"choices": [{"delta": {"tool_calls": [dict(calls[0], index=0)]}}]}))
+    streamed = parser.finish()
+
+    j = {"choices": [{"finish_reason": "tool_calls", "message": {"content": content, "tool_calls": calls}}]}
+    sent = _llm()._parse(j)
+    assert [(type(m), m.__dict__) for m in sent] == [(type(m), m.__dict__) for m in streamed]
+
+
+def test_result_without_content():
+    j = {"choices": [{"finish_reason": "tool_calls", "message": {"content": None, "tool_calls": [_call("ls", {})]}}]}
+    msgs = _llm()._parse(j)
+    assert len(msgs) == 1 and isinstance(msgs[0], FunctionCallMsg)
@@ -0,0 +1,74 @@
+import time
+import asyncio
+
+from bond.config import Config
+from bond.bench.stub_server import StubServer
+from bond.lib.llm.interface import TextMsg, ErorrMsg
+from bond.lib.llm.impl.openai_old import OpenAILLM
+from bond.lib.llm.ratelimit import TokenBucket, limiter_stats, parse_duration, parse_retry_after
+
+
+def _llm(server: StubServer, **ratelimit) -> OpenAILLM:
+    conf = {"base_delay": 0.001, "max_delay": 0.001}
+    conf.update(ratelimit)
+    return OpenAILLM(
+        Config({"provider": {"api_key": "k", "model": "m", "endpoint": server.url}, "ratelimit": conf})
+    )
+
+
+def test_parsing():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("soon") is None
+    assert parse_retry_after("2") == 2
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("later") is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    assert bucket.delay(60, 0.0 + bucket.updated) == 0
+    bucket.take(60)
+    assert 0.9 < bucket.delay(1, bucket.updated) <= 1.0
+    assert TokenBucket(0).delay(10**6, 0.0) == 0
+
+
+def test_429_is_retried_after_retry_after():
+    server = StubServer([{"text": "ok"}], fail_every=2, retry_after=0.3).start()
+    try:
+        llm = _llm(server)
+        assert llm.send([TextMsg("user", "a")], [])[0].data == "ok"
+        t = time.monotonic()
+        msgs = llm.send([TextMsg("user", "b")], [])
+        elapsed = time.monotonic() - t
+    finally:
+        server.stop()
+    assert isinstance(msgs[0], TextMsg) and msgs[0].data == "ok"
+    assert elapsed >= 0.3
+    assert server.requests == 3
+    stats = llm.limiter.stats()
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+    # Shown by endpoint, never with the key the limiter is registered under.
+    assert limiter_stats()[server.url] == stats
+
+
+def test_retry_after_blocks_every_request_on_the_limiter():
+    server = StubServer([{"text": "ok"}], fail_every=1, retry_after=0.3).start()
+    try:
+        llm = _llm(server, max_retries=1)
+
+        async def main():
+            t = time.monotonic()
+            results = await asyncio.gather(*[llm.asend([TextMsg("user", str(i))], []) for i in range(3)])
+            return results, time.monotonic() - t
+
+        results, elapsed = asyncio.run(main())
+    finally:
+        server.stop()
+    # Every attempt is throttled, each request gives up after one retry.
+    assert all(isinstance(r[0], ErorrMsg) and "429" in r[0].data for r in results)
+    assert server.requests == 6
+    assert elapsed >= 0.3
+    assert llm.limiter.stats()["throttled"] == 3
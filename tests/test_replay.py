@@ -0,0 +1,49 @@
+from bond.config import Config
+from bond.lib.functions.registry import ToolRegistry
+from bond.lib.functions.impl.view import ViewFunction
+from bond.lib.functions.impl.search import SearchFunction
+from bond.lib.llm.interface import LLM, TextMsg
+from bond.lib.llm.impl import replay
+from bond.lib.llm.impl.replay import ReplayLLM
+
+
+class Echo(LLM):
+    def __init__(self) -> None:
+        super().__init__(Config({}))
+        self.calls = 0
+
+    def send(self, messages, functions, wire=None):
+        self.calls += 1
+        return [TextMsg("llm", f"answer {self.calls}")]
+
+
+def _replay(tmp_path):
+    config = Config({"provider": {"name": "p", "model": "m"}, "replay": {"path": str(tmp_path)}})
+    return ReplayLLM(config, Echo())
+
+
+def test_registry_and_list_give_the_same_key(tmp_path):
+    llm = _replay(tmp_path)
+    registry = ToolRegistry([ViewFunction, SearchFunction])
+    msgs = [TextMsg("user", "hi")]
+    assert llm.key(msgs, registry, None) == llm.key(msgs, list(registry), None)
+
+
+def test_registry_schemas_are_converted_once(tmp_path, monkeypatch):
+    calls = []
+    original = replay.canonical_function
+    monkeypatch.setattr(replay, "canonical_function", lambda f: calls.append(f) or original(f))
+    llm = _replay(tmp_path)
+    registry = ToolRegistry([ViewFunction, SearchFunction])
+    for i in range(5):
+        llm.key([TextMsg("user", str(i))], registry, None)
+    assert len(calls) == 2
+
+
+def test_replays_recorded_answers(tmp_path):
+    llm = _replay(tmp_path)
+    msgs = [TextMsg("user", "hi")]
+    assert llm.send(msgs, [])[0].data == "answer 1"
+    assert llm.send(msgs, [])[0].data == "answer 1"
+    assert llm.inner.calls == 1
+    assert llm.cache.hits == 1
@@ -0,0 +1,63 @@
+from bond.lib.functions.impl import search as search_mod
+from bond.lib.functions.impl.search import search
+
+
+def _tree(root):
+    (root / ".git").mkdir()
+    (root / ".gitignore").write_text("build/\n/sub/gen/*.txt\n*.log\n")
+    (root / "a.txt").write_text("one\nneedle\nthree\n")
+    (root / "x.log").write_text("needle\n")
+    (root / "build").mkdir()
+    (root / "build" / "b.txt").write_text("needle\n")
+    (root / "sub" / "gen").mkdir(parents=True)
+    (root / "sub" / "gen" / "c.txt").write_text("needle\n")
+    (root / "sub" / "gen" / "c.py").write_text("needle\n")
+    (root / "sub" / ".gitignore").write_text("/deep/skip.txt\n")
+    (root / "sub" / "deep").mkdir()
+    (root / "sub" / "deep" / "skip.txt").write_text("needle\n")
+    (root / "sub" / "deep" / "keep.txt").write_text("needle\n")
+    (root / "bin").write_bytes(b"\0needle")
+
+
+def test_ignore_rules(tmp_path):
+    _tree(tmp_path)
+    r = search("needle", str(tmp_path), False, 0)
+    found = sorted(line.split(":")[0][len(str(tmp_path)) + 1 :] for line in r["output"].splitlines())
+    assert found == ["a.txt", "sub/deep/keep.txt", "sub/gen/c.py"]
+
+
+def test_context_lines_merge(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("".join(f"l{i}\n" for i in range(20)))
+    r = search("l(3|5|15)$", str(f), True, 1)
+    p = str(f)
+    assert r["output"].splitlines() == [
+        f"{p}-2- l2",
+        f"{p}:3: l3",
+        f"{p}-4- l4",
+        f"{p}:5: l5",
+        f"{p}-6- l6",
+        "--",
+        f"{p}-14- l14",
+        f"{p}:15: l15",
+        f"{p}-16- l16",
+    ]
+
+
+def test_context_at_file_edges(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("first\nmid\nlast")
+    r = search("first|last", str(f), True, 2)
+    p = str(f)
+    assert r["output"].splitlines() == [f"{p}:0: first", f"{p}-1- mid", f"{p}:2: last"]
+
+
+def test_pool_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_mod, "POOL_MIN_FILES", 8)
+    monkeypatch.setattr(search_mod, "BATCH_FILES", 3)
+    for i in range(30):
+        (tmp_path / f"f{i}.txt").write_text("x\nneedle\n" if i % 2 else "x\n")
+    r = search("needle", str(tmp_path), False, 0)
+    assert r["success"]
+    assert r["matches"] == 15
+    assert r["files"] == 30
@@ -0,0 +1,55 @@
+import shutil
+
+import pytest
+
+from bond.config import Config
+from bond.lib.agent.main import Chat
+from bond.lib.functions import shell
+from bond.lib.functions.capture import Capture
+from bond.lib.llm.interface import LLM
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+
+
+def _run(session, *args):
+    out, err = Capture(), Capture()
+    return session.run(list(args), 5, out, err), out
+
+
+def test_state_carries_over(tmp_path):
+    session = shell.ShellSession(["bash", "--noprofile", "--norc"])
+    try:
+        _run(session, "cd", str(tmp_path))
+        _, out = _run(session, "pwd")
+        assert out.text().strip() == str(tmp_path)
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def sessions_on():
+    shell.configure(Config({"shell": {"enabled": True}}))
+    try:
+        yield
+    finally:
+        shell.configure(Config({}))
+        shell.close_sessions()
+
+
+def test_drop_thread_closes_the_session(sessions_on):
+    chat = Chat(LLM(Config({})))
+    thread = chat.new_thread()
+    session = shell.get_session(thread)
+    _run(session, "true")
+    process = session.process
+    assert process is not None and process.poll() is None
+
+    chat.drop_thread(thread)
+    assert process.poll() is not None
+    assert thread not in shell._sessions
+    assert shell.get_session(thread) is not session
+
+
+def test_sessions_are_off_again():
+    assert not shell.enabled()
+    assert not shell._sessions
@@ -0,0 +1,64 @@
+import pytest
+
+from bond.config import Config
+from bond.lib.agent.store import SessionStore
+from bond.lib.llm.interface import TextMsg, FunctionCallMsg, FunctionResultMsg
+
+
+def _store(tmp_path) -> SessionStore:
+    return SessionStore(Config({"sessions": {"path": str(tmp_path), "flush_interval": 0.01}}))
+
+
+def _dump(msgs):
+    return [(type(m).__name__, m.__dict__) for m in msgs]
+
+
+def test_round_trip(tmp_path):
+    store = _store(tmp_path)
+    store.create("t1")
+    msgs = [
+        TextMsg("user", "fix the bug\nin main.py"),
+        FunctionCallMsg("view", {"path": "main.py", "offset": 0}),
+        FunctionResultMsg("view", {"success": True, "output": "0|x"}),
+        TextMsg("llm", "draft"),
+    ]
+    for m in msgs:
+        store.append("t1", m)
+    store.replace("t1", 3, TextMsg("llm", "done"))
+    store.append("t1", TextMsg("user", "thanks"))
+    store.truncate("t1", 4)
+    store.close()
+
+    expected = msgs[:3] + [TextMsg("llm", "done")]
+    reopened = _store(tmp_path)
+    assert _dump(reopened.load("t1")) == _dump(expected)
+    (meta,) = reopened.sessions()
+    assert meta["id"] == "t1"
+    assert meta["title"] == "fix the bug"
+    assert meta["count"] == 4
+    reopened.close()
+
+
+def test_fork_and_order(tmp_path):
+    store = _store(tmp_path)
+    store.create("a")
+    for i in range(3):
+        store.append("a", TextMsg("user", f"m{i}"))
+    assert [m.data for m in store.fork("a", "b", 2)] == ["m0", "m1"]
+    store.flush()
+    assert [m.data for m in store.load("b")] == ["m0", "m1"]
+    sessions = store.sessions()
+    assert [s["id"] for s in sessions][0] == "b"
+    assert sessions[0]["parent"] == "a"
+
+    # Callers get copies, not the store's own metadata.
+    sessions[0]["title"] = "changed"
+    assert store.sessions()[0]["title"] != "changed"
+    store.close()
+
+
+def test_rejects_bad_ids(tmp_path):
+    store = _store(tmp_path)
+    with pytest.raises(ValueError):
+        store.create("../x")
+    store.close()
@@ -0,0 +1,65 @@
+import os
+import mmap
+import time
+
+from bond.lib.functions.impl import view as view_mod
+from bond.lib.functions.impl.view import view
+
+
+def _write_lines(path, n, end="\n"):
+    path.write_text("".join(f"line {i}{end}" for i in range(n)))
+
+
+def test_window_and_absolute_line_numbers(tmp_path):
+    f = tmp_path / "a.txt"
+    _write_lines(f, 3000)
+    r = view(str(f), 2000)
+    assert r["success"]
+    assert r["lines"] == 3000
+    first = r["output"].splitlines()[0]
+    assert first == "2000|line 2000"
+
+
+def test_tail_mode(tmp_path):
+    f = tmp_path / "a.txt"
+    _write_lines(f, 50)
+    r = view(str(f), -3)
+    assert r["output"].splitlines() == ["47|line 47", "48|line 48", "49|line 49"]
+
+
+def test_offset_past_end_is_an_error_and_fast(tmp_path):
+    f = tmp_path / "a.txt"
+    _write_lines(f, 10)
+    for offset in (10, 10**6, 10**9):
+        start = time.monotonic()
+        r = view(str(f), offset)
+        assert not r["success"]
+        assert "past end" in r["error"]
+        assert time.monotonic() - start < 0.5
+
+
+def test_seek_is_bounded_by_line_count(tmp_path):
+    f = tmp_path / "a.txt"
+    _write_lines(f, 10)
+    with open(f, "rb") as fp:
+        st = os.fstat(fp.fileno())
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = view_mod._LineIndex(mm, st.st_size)
+            assert index.seek(mm, 10**9) == st.st_size
+
+
+def test_last_line_without_newline(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a\nb")
+    r = view(str(f), 0)
+    assert r["lines"] == 2
+    assert r["output"] == "0|a\n1|b"
+
+
+def test_binary_hexdump_and_offset(tmp_path):
+    f = tmp_path / "a.bin"
+    f.write_bytes(bytes(range(256)) * 8)
+    r = view(str(f), 0)
+    assert r["success"]
+    assert r["output"].startswith("00000000  00 01 02")
+    assert not view(str(f), 4096)["success"]
@@ -0,0 +1,148 @@
+import os
+import time
+import threading as thr
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bond.config import Config
+from bond.lib.functions.web import HTTPCache, WebClient, _expires, is_text
+
+
+def test_expires_rules():
+    now = 1000.0
+    assert _expires({"Cache-Control": "no-store, max-age=60"}, now) is None
+    assert _expires({"Cache-Control": "no-cache"}, now) == 0.0
+    assert _expires({"Cache-Control": "public, max-age=60"}, now) == 1060
+    assert _expires({"Cache-Control": "max-age=60", "Age": "50"}, now) == 1010
+    assert _expires({"Expires": formatdate(2000, usegmt=True)}, now) == 2000
+    assert _expires({"Cache-Control": "max-age=oops"}, now) == 0.0
+    assert _expires({}, now) == 0.0
+
+
+def test_is_text():
+    assert is_text("text/html; charset=utf-8")
+    assert is_text("application/vnd.api+json")
+    assert is_text("")
+    assert not is_text("image/png")
+
+
+def test_cache_round_trip_and_eviction(tmp_path):
+    cache = HTTPCache(tmp_path, max_bytes=1000)
+    cache.put("http://a/", {"content_type": "text/plain", "expires": 1.0}, b"a" * 300)
+    meta, body = cache.get("http://a/")
+    assert body == b"a" * 300 and meta["expires"] == 1.0
+    assert cache.get("http://b/") is None
+
+    # Reading a bumps it above b, so b goes first.
+    cache.put("http://b/", {}, b"b" * 300)
+    old = time.time() - 100
+    for url in ("http://a/", "http://b/"):
+        os.utime(cache._file(url), (old, old))
+    cache.get("http://a/")
+    cache.put("http://c/", {}, b"c" * 300)
+    assert cache.get("http://b/") is None
+    assert cache.get("http://a/") is not None
+    assert cache.get("http://c/") is not None
+
+    # The size survives a restart.
+    assert HTTPCache(tmp_path, max_bytes=1000)._size == cache._size
+
+
+class _Handler(BaseHTTPRequestHandler):
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        _Handler.hits[self.path] = _Handler.hits.get(self.path, 0) + 1
+        if self.path == "/fresh":
+            self._send(200, b"fresh", {"Cache-Control": "max-age=60"})
+        elif self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304, b"", {"ETag": '"v1"'})
+            else:
+                self._send(200, b"tagged", {"ETag": '"v1"'})
+        elif self.path == "/nostore":
+            self._send(200, b"secret", {"Cache-Control": "no-store"})
+        elif self.path == "/big":
+            self._send(200, b"x" * 5000, {"Cache-Control": "max-age=60"})
+        elif self.path == "/png":
+            self._send(200, b"\x89PNG", {"Content-Type": "image/png"})
+        else:
+            self._send(404, b"", {})
+
+    def _send(self, code, body, headers):
+        self.send_response(code)
+        headers.setdefault("Content-Type", "text/plain")
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    _Handler.hits = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    t = thr.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _client(tmp_path, **conf):
+    return WebClient(Config({"web_fetch": dict({"cache_path": str(tmp_path), "max_bytes": 1000}, **conf)}))
+
+
+def test_fresh_responses_are_served_from_cache(server, tmp_path):
+    client = _client(tmp_path)
+    assert client.fetch(f"{server}/fresh").body == b"fresh"
+    second = client.fetch(f"{server}/fresh")
+    assert second.cached and second.body == b"fresh"
+    assert _Handler.hits["/fresh"] == 1
+    assert client.stats() == {"hits": 1, "revalidated": 0, "misses": 1}
+
+
+def test_etag_revalidation(server, tmp_path):
+    client = _client(tmp_path)
+    assert not client.fetch(f"{server}/etag").cached
+    again = client.fetch(f"{server}/etag")
+    assert again.cached and again.body == b"tagged"
+    assert _Handler.hits["/etag"] == 2
+    assert client.revalidated == 1
+
+
+def test_not_stored(server, tmp_path):
+    client = _client(tmp_path)
+    for _ in range(2):
+        assert not client.fetch(f"{server}/nostore").cached
+    big = client.fetch(f"{server}/big")
+    assert big.truncated and len(big.body) == 1000
+    assert not client.fetch(f"{server}/big").cached
+    assert _Handler.hits == {"/nostore": 2, "/big": 2}
+
+
+def test_fetch_all_returns_errors_in_place(server, tmp_path):
+    client = _client(tmp_path, cache=False)
+    fresh, png, missing = client.fetch_all([f"{server}/fresh", f"{server}/png", f"{server}/missing"])
+    assert fresh.body == b"fresh" and not fresh.cached
+    assert isinstance(png, ValueError)
+    assert isinstance(missing, Exception)
+
+
+def test_replay_cache_shares_the_eviction(tmp_path):
+    from bond.lib.llm.impl.replay import ReplayCache
+    from bond.lib.llm.interface import TextMsg
+
+    cache = ReplayCache(tmp_path, max_bytes=600)
+    for key in ("aa01", "bb02", "cc03"):
+        cache.put(key, [TextMsg("llm", os.urandom(200).hex())])
+    assert cache.get("aa01") is None
+    assert cache.get("cc03")[0].data
+    assert cache._size <= 600
+    assert not list(tmp_path.glob("*/*.tmp"))